@@ -2,19 +2,38 @@ import os
 from os import getenv
 from pathlib import Path
 import pathlib
+import threading
 import time
-from agno.agent import Agent, RunResponse
+from agno.agent import Agent, RunOutput
 from agno.models.openai.like import OpenAILike
-from agno.tools.googlesearch import GoogleSearchTools
 from agno.models.openrouter import OpenRouter
 from agno.media import Image, Audio, Video, File
-from agno.tools.wikipedia import WikipediaTools
-from agno.tools.arxiv import ArxivTools
 
 from agno.tools import tool
 from pprint import pprint
 from dotenv import load_dotenv
 
+from agent_pool import AgentPool, openrouter_model
+# The extension sets and _detect_media_type moved to attachments.py, imported here for existing callers
+from attachments import (AUDIO_EXTS, CODE_EXTS, IMAGE_EXTS, SPREADSHEET_EXTS, TEXT_EXTS, VIDEO_EXTS, detect_media_type,
+                         detect_media_type as _detect_media_type)
+from compaction import compact_tool_hook, compaction_fingerprint, question_budget
+from consistency import (SELF_CONSISTENCY_SAMPLES, SELF_CONSISTENCY_TEMPERATURE, SELF_CONSISTENCY_THRESHOLD,
+                         self_consistent_answer)
+from hashing import text_sha256
+from tool_cache import cached_toolkit
+from media_preprocessing import keyframes_available
+from media_session import MediaSession
+from extractors import extract_for_prompt, get_chunk_index
+from code_runner import CodeExecutionTool
+from spreadsheet_query import SpreadsheetQueryTool, get_database
+from resilience import resilient_toolkit
+from replay import replayable_model, replayable_toolkit
+from tracing import trace_tool_hook, traced_model, tracer
+from router import ROUTER_ENABLED, QuestionRouter, router_fingerprint
+from prompts import compile_prompt, with_prompt_caching
+from parallel_tools import PARALLEL_TOOL_CALLS, PARALLEL_TOOLS_INSTRUCTION, ParallelToolsOpenRouter
+
 load_dotenv()
 openrouter_api_key = os.environ.get("OPENROUTER_API_KEY")
 openrouter_model_id = "openai/gpt-5-mini"
@@ -24,140 +43,262 @@ image_agent_model_id="openai/gpt-5-mini"
 # openrouter_model_id = "openrouter/sonoma-sky-alpha"
 # openrouter_model_id = "moonshotai/kimi-k2-0905"
 
-media_agent = Agent(
-    model=OpenRouter(
-        api_key=openrouter_api_key,
-        id=openrouter_model_id,
-        temperature=0.05,
-    ),
-    reasoning=False,
-    system_message=(
-        "You are a concise media question-answering assistant. "
-        "When the user provides or references media, your sole task is to answer the specific question asked about it. "
-        "Do not provide a general description. "
-        "If the question can be answered from the media, provide the most direct, concise answer possible. "
-        "If the media contains text content, transcribe or summarize it as needed to answer the question. "
-        "If the question cannot be answered from the media, reply 'idk', do not make up an answer. "
-        "Do not elaborate or add extra information. "
-    )
+MEDIA_SYSTEM_MESSAGE = (
+    "You are a concise media question-answering assistant. "
+    "When the user provides or references media, your sole task is to answer the specific question asked about it. "
+    "Do not provide a general description. "
+    "If the question can be answered from the media, provide the most direct, concise answer possible. "
+    "If the media contains text content, transcribe or summarize it as needed to answer the question. "
+    "If the question cannot be answered from the media, reply 'idk', do not make up an answer. "
+    "Do not elaborate or add extra information. "
+)
+
+REASONING_ROLE = (
+    "You are a concise assistant that uses tools to answer questions. "
+    "Before answering any question, first think deeply and step by step about what tools you should use to find the answer. "
+)
+
+# Used by the no_tools plan, for questions that contain everything needed to answer them
+REASONING_NO_TOOLS_ROLE = (
+    "You are a concise assistant that answers questions by reasoning step by step over the information given in the question. "
+)
+
+REASONING_SEARCH_TOOLS = (
+    "Use the 'GoogleSearchTools' tool to find relevant information. "
+    "ALWAYS USE 'GoogleSearchTools', for every question. "
+    "Use the 'WikipediaTools' tool to get summaries of topics from Wikipedia. "
+    "Use the 'ArxivTools' tool to get summaries of academic papers from arXiv. "
+    "IMPORTANT: Always use tools to find information, do not try to answer from memory. "
+    "IMPORTANT: ALways use tools in this order: WikipediaTools, ArxivTools, GoogleSearchTools, if the question is not about media. "
+)
+
+# Without OpenCV, media_preprocessing sends the video file itself
+REASONING_VIDEO_INSTRUCTION = (
+    "Video files are shown to 'MediaQuestionTool' as keyframes without sound, so ask it about what can be seen. "
+    if keyframes_available() else
+    "Video files are given to 'MediaQuestionTool' as they are. "
 )
 
-IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp", ".tiff"}
-AUDIO_EXTS = {".mp3", ".wav", ".m4a", ".flac", ".ogg"}
-VIDEO_EXTS = {".mp4", ".mov", ".mkv", ".avi", ".webm"}
-CODE_EXTS = {".py", ".js", ".json", ".html", ".css", ".java", ".c", ".cpp", ".cs", ".rb", ".go", ".rs", ".ts"}
-SPREADSHEET_EXTS = {".xlsx", ".xls", ".csv", ".tsv"}
-TEXT_EXTS = {".txt", ".md", ".pdf", ".docx"}
-
-def _detect_media_type(path: str) -> str:
-    ext = pathlib.Path(path).suffix.lower()
-    if ext in IMAGE_EXTS:
-        return "image"
-    if ext in AUDIO_EXTS:
-        return "audio"
-    if ext in VIDEO_EXTS:
-        return "video"
-    if ext in CODE_EXTS:
-        return "code"
-    if ext in SPREADSHEET_EXTS:
-        return "spreadsheet"
-    if ext in TEXT_EXTS:
-        return "text"
-
-    return "file"
-
-def _call_media_agent(media_type, media_path, prompt):
-    images=[Image(filepath=media_path)] if media_type == 'image' else None
-    audio=[Audio(filepath=media_path)] if media_type == 'audio' else None
-    videos=[Video(filepath=media_path)] if media_type == 'video' else None
-
-
-    # print(f"Calling media_agent with prompt: {prompt}")
-    # print(f"Calling media_agent with media_type: {media_type}")
-    # print(f"with images: {images}")
-    # print(f"with audio: {audio}")
-    # print(f"with videos: {videos}")
-    # print(f"with files: {files}")
-
-    return media_agent.run(prompt, images=images, audio=audio, videos=videos)
-
-
-def MediaQuestionTool(media_path: str = "", question: str = "") -> str:
-    """Use this tool to ask a specific question about a local media file (image, audio, or video).
-    
+REASONING_MEDIA_TOOLS = (
+    "Use the 'MediaQuestionTool' tool to ask a specific question about an image, audio, or video file. You can call this tool multiple times with different questions about the same media file if needed. "
+    "ALWAYS USE 'MediaQuestionTool' when the user provides or references an image, audio, or video files in his question. "
+    "When asked about a media file, you will receive a path to the local file in the prompt, which you should pass exactly as it is to 'MediaQuestionTool' along with your specific question about it. "
+    "IMPORTANT: Always provide a specific question to 'MediaQuestionTool' that is relevant to the user's original question, rather than just asking for a general description of the media. "
+    "IMPORTANT: Always provide the exact local path as-is to 'MediaQuestionTool' without modifying it. "
+    + REASONING_VIDEO_INSTRUCTION +
+    "IMPORTANT: Always use tools in this order: WikipediaTools, ArxivTools, GoogleSearchTools, MediaQuestionTool, if the question is about media. And remember to call MediaQuestionTool as many times as needed. "
+)
+
+REASONING_ANSWER_FORMAT = (
+    "After calling all the needed tools, think step by step about the information you get from the tools, and how it relates to the question, then formulate your final answer. "
+    "Do not just copy and paste the content from the tools; instead, synthesize the information to provide a concise and accurate answer. "
+    "Always answer in the shortest possible form: a single number, a single word, or at most a few words. "
+    "Never explain or elaborate unless explicitly asked. "
+    "Omit punctuation at the end of sentences/words, and omit any units unless explicitly asked. "
+    "If you don't know, reply 'idk', do not try to make up an answer. "
+)
+
+ATTACHMENT_SEARCH_INSTRUCTION = (
+    "Large attached files are truncated in the prompt. "
+    "Use the 'AttachmentSearchTool' tool with the file path from the truncation note and a specific query to read the relevant parts of the rest of the file. "
+)
+SPREADSHEET_QUERY_INSTRUCTION = (
+    "Attached spreadsheets are given as table schemas with a few sample rows. "
+    "Use the 'SpreadsheetQueryTool' tool with the file path and a SQL query to filter, count, sum or average the data, never compute them from the sample rows. "
+)
+CODE_EXECUTION_INSTRUCTION = (
+    "When asked about the output or result of an attached Python file, use the 'CodeExecutionTool' tool with the file path to run it, do not simulate it. "
+)
+ATTACHMENT_INSTRUCTIONS = ATTACHMENT_SEARCH_INSTRUCTION + SPREADSHEET_QUERY_INSTRUCTION + CODE_EXECUTION_INSTRUCTION
+
+# Fragments are ordered from never changing to configuration dependent, so the prompt prefix
+# stays identical across runs and providers can serve it from their prompt cache
+MEDIA_PROMPT = compile_prompt("Media", [("role", MEDIA_SYSTEM_MESSAGE)])
+PARALLEL_FRAGMENT = ("parallel tools", PARALLEL_TOOLS_INSTRUCTION if PARALLEL_TOOL_CALLS else "")
+# The full prompt is used without the router, the others by the plan of the same name
+PLAN_PROMPTS = {
+    None: compile_prompt("Reasoning", [
+        ("role", REASONING_ROLE),
+        ("search tools", REASONING_SEARCH_TOOLS),
+        ("media tools", REASONING_MEDIA_TOOLS),
+        ("answer format", REASONING_ANSWER_FORMAT),
+        ("attachments", ATTACHMENT_INSTRUCTIONS),
+        PARALLEL_FRAGMENT,
+    ]),
+    "no_tools": compile_prompt("Reasoning no_tools", [
+        ("role", REASONING_NO_TOOLS_ROLE),
+        ("answer format", REASONING_ANSWER_FORMAT),
+    ]),
+    "search": compile_prompt("Reasoning search", [
+        ("role", REASONING_ROLE),
+        ("search tools", REASONING_SEARCH_TOOLS),
+        ("answer format", REASONING_ANSWER_FORMAT),
+        PARALLEL_FRAGMENT,
+    ]),
+    "file": compile_prompt("Reasoning file", [
+        ("role", REASONING_ROLE),
+        ("search tools", REASONING_SEARCH_TOOLS),
+        ("answer format", REASONING_ANSWER_FORMAT),
+        ("attachments", ATTACHMENT_INSTRUCTIONS),
+        PARALLEL_FRAGMENT,
+    ]),
+    "media": compile_prompt("Reasoning media", [
+        ("role", REASONING_ROLE),
+        ("search tools", REASONING_SEARCH_TOOLS),
+        ("media tools", REASONING_MEDIA_TOOLS),
+        ("answer format", REASONING_ANSWER_FORMAT),
+        ("attachments", ATTACHMENT_INSTRUCTIONS),
+        PARALLEL_FRAGMENT,
+    ]),
+}
+REASONING_PROMPT = PLAN_PROMPTS[None]
+
+def prompt_report() -> str:
+    """Token accounting of every compiled system prompt, printed by `python pipeline.py prompts`."""
+    return "\n".join(prompt.report() for prompt in [MEDIA_PROMPT, *PLAN_PROMPTS.values()])
+
+ATTACHMENT_SEARCH_CHUNKS = int(os.getenv("ATTACHMENT_SEARCH_CHUNKS", "5"))
+
+def create_media_agent(model=None):
+    return Agent(
+        model=traced_model(replayable_model(model or with_prompt_caching(openrouter_model(
+            api_key=openrouter_api_key,
+            id=openrouter_model_id,
+            temperature=0.05,
+        )))),
+        reasoning=False,
+        system_message=MEDIA_PROMPT.text,
+    )
+
+def create_media_question_tool(media_agent_pool):
+    # Every call borrows its own media agent from the pool, so concurrent calls never share run state.
+    # Questions about the same file that arrive together are batched into one request.
+    session = MediaSession(media_agent_pool)
+
+    def MediaQuestionTool(media_path: str = "", question: str = "") -> str:
+        """Use this tool to ask a specific question about a local media file (image, audio, or video).
+        
+        Args:
+            media_path: The exact absolute local path to the media file.
+            question: The specific question to ask about the media.
+        
+        Returns:
+            str: A concise answer to the question, or 'idk' if not known, or 'file not found' if the file doesn't exist.
+        """
+
+        if not media_path or not pathlib.Path(media_path).exists():
+            return 'file not found'
+        
+        media_path = str(media_path)
+        print(f"MediaProcessing received media_path: {media_path}")
+
+        media_type = detect_media_type(media_path)
+
+        # Call media_agent, the file is encoded once and shared with other pending questions about it
+        result = session.ask(media_type, media_path, question)
+        print(f"MediaProcessing got response: {result}")
+
+        return result
+
+    return MediaQuestionTool
+
+def AttachmentSearchTool(file_path: str = "", query: str = "") -> str:
+    """Use this tool to search a large attached text, document, code or spreadsheet file that was truncated in the prompt.
+
     Args:
-        media_path: The exact absolute local path to the media file.
-        question: The specific question to ask about the media.
-    
+        file_path: The exact local path to the file, as given in the truncation note.
+        query: Keywords describing the information you are looking for.
+
     Returns:
-        str: A concise answer to the question, or 'idk' if not known, or 'file not found' if the file doesn't exist.
+        str: The best matching parts of the file, each labelled with its position (lines, rows or page), or 'file not found' if the file doesn't exist.
     """
 
-    if not media_path or not pathlib.Path(media_path).exists():
+    if not file_path or not pathlib.Path(file_path).exists():
         return 'file not found'
-    
-    media_path = str(media_path)
-    print(f"MediaProcessing received media_path: {media_path}")
-
-    media_type = _detect_media_type(media_path)
-
-    # Build the prompt for media_agent using the convention your media_agent expects:
-    prompt = f"Describe the content of this {media_type}, including information relevant to the following user question. " + question
-
-    # Call media_agent
-    resp = _call_media_agent(media_type, media_path, prompt)
-    result = resp.content
-    print(f"MediaProcessing got response: {result}")
-
-    return result
-
-reasoning_agent = Agent(
-    # model=OpenAILike(
-    #     id="openai/gpt-oss-20b",
-    #     api_key="123",
-    #     base_url="http://192.168.1.157:1234/v1",
-    #     reasoning_effort="high",
-    #     temperature=0.05,
-    # ),
-    model=OpenRouter(
-        api_key=openrouter_api_key,
-        id=openrouter_model_id,
-        temperature=0.05,
-    ),
-    tools=[GoogleSearchTools(), WikipediaTools(), ArxivTools(), MediaQuestionTool],
-    reasoning=False,
-    system_message=(
-        "You are a concise assistant that uses tools to answer questions."
-        "Before answering any question, first think deeply and step by step about what tools you should use to find the answer."
-        "Use the 'GoogleSearchTools' tool to find relevant information."
-        "ALWAYS USE 'GoogleSearchTools', for every question."
-        "Use the 'MediaQuestionTool' tool to ask a specific question about an image, audio, or video file. You can call this tool multiple times with different questions about the same media file if needed."
-        "ALWAYS USE 'MediaQuestionTool' when the user provides or references an image, audio, or video files in his question."
-        "When asked about a media file, you will receive a path to the local file in the prompt, which you should pass exactly as it is to 'MediaQuestionTool' along with your specific question about it."
-        "IMPORTANT: Always provide a specific question to 'MediaQuestionTool' that is relevant to the user's original question, rather than just asking for a general description of the media."
-        "IMPORTANT: Always provide the exact local path as-is to 'MediaQuestionTool' without modifying it."
-        "IMPORTANT: Currenly video files are not supported by 'MediaQuestionTool', so when asked about video just reply 'video not supported'."
-        "Use the 'WikipediaTools' tool to get summaries of topics from Wikipedia."
-        "Use the 'ArxivTools' tool to get summaries of academic papers from arXiv."
-        "IMPORTANT: Always use tools to find information, do not try to answer from memory."
-        "IMPORTANT: ALways use tools in this order: WikipediaTools, ArxivTools, GoogleSearchTools, if the question is not about media."
-        "IMPORTANT: Always use tools in this order: WikipediaTools, ArxivTools, GoogleSearchTools, MediaQuestionTool, if the question is about media. And remember to call MediaQuestionTool as many times as needed."
-        "After calling all the needed tools, think step by step about the information you get from the tools, and how it relates to the question, then formulate your final answer."
-        "Do not just copy and paste the content from the tools; instead, synthesize the information to provide a concise and accurate answer."
-        "Think step by step about the information you get from the tools, and how it relates to the question, then formulate your final answer."
-        "Always answer in the shortest possible form:"
-        "a single number, a single word, or at most a few words."
-        "Never explain or elaborate unless explicitly asked."
-        "Omit punctuation at the end of sentences/words, and omit any units unless explicitly asked."
-        "If you don't know, reply 'idk', do not try to make up an answer. "
+
+    print(f"AttachmentSearch received file_path: {file_path}, query: {query}")
+    chunks = get_chunk_index(str(file_path), detect_media_type(file_path)).search(query, ATTACHMENT_SEARCH_CHUNKS)
+    if not chunks:
+        return 'no matching content'
+    return "\n\n".join(chunk.render() for chunk in chunks)
+
+def create_reasoning_agent(media_agent_pool=None, model=None, plan=None, model_id=None, temperature=0.05):
+    """Builds a reasoning agent with every tool and the prompt of a router plan, or the full prompt when plan is None."""
+    # The search toolkits are imported on first use, they add to the import time of every CLI command
+    from agno.tools.arxiv import ArxivTools
+    from agno.tools.googlesearch import GoogleSearchTools
+    from agno.tools.wikipedia import WikipediaTools
+
+    if media_agent_pool is None:
+        media_agent_pool = AgentPool(create_media_agent)
+
+    # Recording is outermost, so results served by the tool cache are recorded too
+    search_tools = [
+        replayable_toolkit(cached_toolkit(resilient_toolkit(GoogleSearchTools(), "google"))),
+        replayable_toolkit(cached_toolkit(resilient_toolkit(WikipediaTools(), "wikipedia"))),
+        replayable_toolkit(cached_toolkit(resilient_toolkit(ArxivTools(), "arxiv"))),
+    ]
+    # Every plan keeps every tool, the plan only narrows the prompt and the model tier
+    tools = search_tools + [create_media_question_tool(media_agent_pool), AttachmentSearchTool, SpreadsheetQueryTool, CodeExecutionTool]
+
+    return Agent(
+        # model=OpenAILike(
+        #     id="openai/gpt-oss-20b",
+        #     api_key="123",
+        #     base_url="http://192.168.1.157:1234/v1",
+        #     reasoning_effort="high",
+        #     temperature=0.05,
+        # ),
+        model=traced_model(replayable_model(model or with_prompt_caching(openrouter_model(
+            model_class=ParallelToolsOpenRouter if PARALLEL_TOOL_CALLS else OpenRouter,
+            api_key=openrouter_api_key,
+            id=model_id or openrouter_model_id,
+            temperature=temperature,
+        )))),
+        tools=tools,
+        # Hooks run outermost first, so the trace span records the compacted output
+        tool_hooks=[trace_tool_hook, compact_tool_hook],
+        reasoning=False,
+        system_message=PLAN_PROMPTS[plan].text,
     )
-)
+
+def agent_fingerprint() -> str:
+    """Identifies the model, system prompts and routing answers are produced with, so cached answers can be invalidated."""
+    prompts = MEDIA_PROMPT.text + "".join(plan_prompt.text for plan_prompt in PLAN_PROMPTS.values())
+    fingerprint = f"{openrouter_model_id}|{text_sha256(prompts)}|{router_fingerprint()}|{compaction_fingerprint()}"
+    if SELF_CONSISTENCY_SAMPLES > 1:
+        fingerprint += f"|samples={SELF_CONSISTENCY_SAMPLES}@{SELF_CONSISTENCY_THRESHOLD:g},t={SELF_CONSISTENCY_TEMPERATURE:g}"
+    return fingerprint
+
+# Media agents keep no state between calls, so one pool is shared by every tool and BasicAgent.
+# The pool builds its first agent on the first media question, not at import.
+media_agent_pool = AgentPool(create_media_agent)
+MediaQuestionTool = create_media_question_tool(media_agent_pool)
+# The router is stateless apart from its decision counts, so one serves every BasicAgent
+question_router = QuestionRouter() if ROUTER_ENABLED else None
+_module_agents_lock = threading.Lock()
+
+def __getattr__(name):
+    # The module level `media_agent` and `reasoning_agent` are built on first access,
+    # so importing agent stays cheap for the callers that never use them
+    if name not in ("media_agent", "reasoning_agent"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _module_agents_lock:
+        if name not in globals():
+            if name == "media_agent":
+                globals()[name] = create_media_agent()
+                media_agent_pool.add(globals()[name])
+            else:
+                globals()[name] = create_reasoning_agent(media_agent_pool)
+        return globals()[name]
 
 def _handle_paused_run(agent: Agent, prompt: str) -> str:
     print(f"Agent input: {prompt}")
 
     start = time.time()
-    run_response = agent.run(prompt)
+    with tracer.span("agent.run") as span:
+        run_response = agent.run(prompt)
+        span.set(is_paused=run_response.is_paused)
 
     # Set a counter for the loop depth
     loop_count = 0
@@ -173,7 +314,9 @@ def _handle_paused_run(agent: Agent, prompt: str) -> str:
                 tool.confirmed = True
                 
         # Continue the agent's run with the confirmed tool call
-        run_response = agent.continue_run()
+        with tracer.span("agent.continue_run", iteration=loop_count + 1) as span:
+            run_response = agent.continue_run(run_response)
+            span.set(is_paused=run_response.is_paused)
         loop_count += 1
 
     end = time.time()
@@ -195,25 +338,104 @@ def _handle_paused_run(agent: Agent, prompt: str) -> str:
 
 # --- Basic Agent Definition ---
 class BasicAgent:
-    def __init__(self):
+    def __init__(self, model=None):
+        # Every BasicAgent owns its reasoning agent, so several can answer questions concurrently.
+        # Media agents come from the shared pool unless a custom model is used.
+        self.media_agent_pool = AgentPool(lambda: create_media_agent(model)) if model else media_agent_pool
+        self.model = model
+        self._reasoning_agent = None
+        # Reasoning agents of router plans, built on first use and keyed on (plan, model id)
+        self.plan_agents = {}
+        # Pools of sampling agents for the self-consistency mode, keyed like plan_agents
+        self.sample_pools = {}
+        # Share of the self-consistency samples that agreed with the last answer, None with one run
+        self.last_confidence = None
         print("BasicAgent initialized.")
+
+    @property
+    def reasoning_agent(self) -> Agent:
+        """The agent with every tool, used without the router. Built on first use, the router plans rarely need it."""
+        if self._reasoning_agent is None:
+            self._reasoning_agent = create_reasoning_agent(self.media_agent_pool, self.model)
+        return self._reasoning_agent
+
+    def _agent_for(self, decision) -> Agent:
+        key = (decision.plan, decision.model_id)
+        if key not in self.plan_agents:
+            self.plan_agents[key] = create_reasoning_agent(self.media_agent_pool, self.model, decision.plan, decision.model_id)
+        return self.plan_agents[key]
+
+    def _sample(self, decision, agent_input: str, question: str) -> tuple:
+        """Answers with up to SELF_CONSISTENCY_SAMPLES concurrent runs, each on its own agent from the pool of the plan."""
+        plan, model_id = (decision.plan, decision.model_id) if decision else (None, None)
+        if (plan, model_id) not in self.sample_pools:
+            self.sample_pools[(plan, model_id)] = AgentPool(lambda: create_reasoning_agent(
+                self.media_agent_pool, self.model, plan, model_id, temperature=SELF_CONSISTENCY_TEMPERATURE,
+            ))
+        pool = self.sample_pools[(plan, model_id)]
+
+        def run_sample(index):
+            # Every sample has its own tool output budget
+            with pool.acquire() as agent, tracer.span("sample", index=index), question_budget(question):
+                return _handle_paused_run(agent, agent_input)
+
+        return self_consistent_answer(run_sample)
+
     def __call__(self, question: str, media_path: str = None) -> str:
         print(f"Agent received question (first 50 chars): {question[:50]}...")
 
+        media_type = None
         if media_path and Path(media_path).exists():
-            media_type = _detect_media_type(media_path)
-
-            if media_type not in {'image', 'audio', 'video'}:
-                with open(media_path, 'r', encoding='utf-8') as f:
-                    file_content = f.read()
-                    agent_input = f"Attached {media_type} file content:\n{file_content}\n\nQuestion: {question}"
+            media_type = detect_media_type(media_path)
+
+            spreadsheet_schema = None
+            if media_type == 'spreadsheet':
+                try:
+                    spreadsheet_schema = get_database(str(media_path)).describe()
+                except Exception as e:
+                    print(f"Could not load spreadsheet {media_path}, attaching its content instead: {e}")
+
+            if spreadsheet_schema is not None:
+                # Only the schema goes into the prompt, the data is queried with SpreadsheetQueryTool
+                agent_input = f"Attached spreadsheet file {media_path}:\n{spreadsheet_schema}\n\nQuestion: {question}"
+            elif media_type not in {'image', 'audio', 'video'}:
+                # Only as much of the file as fits the token budget is read, the rest is searchable
+                file_content, truncated = extract_for_prompt(str(media_path), media_type)
+                if truncated:
+                    print(f"Attachment {media_path} truncated to the token budget")
+                agent_input = f"Attached {media_type} file {media_path} content:\n{file_content}\n\nQuestion: {question}"
             else:
                 # Format the input so the reasoning agent sees the media reference and is likely to call MediaProcessing
                 agent_input = f"Media: {media_type}={media_path} | Question: {question}"
         else:
             agent_input = question
 
-        new_answer_content = _handle_paused_run(reasoning_agent, agent_input)
+        decision = question_router.route(question, media_type) if question_router else None
+
+        with tracer.span("question", question=question, media_path=str(media_path) if media_path else None) as span:
+            if decision:
+                span.set(**decision.to_dict())
+            if SELF_CONSISTENCY_SAMPLES > 1:
+                # The samples run on agents of their own pool, the plan agent is not needed
+                new_answer_content, self.last_confidence, runs = self._sample(decision, agent_input, question)
+                span.set(confidence=self.last_confidence, samples=runs)
+            else:
+                reasoning_agent = self._agent_for(decision) if decision else self.reasoning_agent
+                model = reasoning_agent.model
+                if isinstance(model, ParallelToolsOpenRouter):
+                    model.reset_tool_latency()
+
+                # Long tool outputs are cut to the parts relevant to the question before they enter the history
+                with question_budget(question) as budget:
+                    new_answer_content = _handle_paused_run(reasoning_agent, agent_input)
+                span.set(tool_output_tokens=budget.used)
+                self.last_confidence = None
+
+                if isinstance(model, ParallelToolsOpenRouter) and model.tool_latency["calls"]:
+                    latency = model.tool_latency
+                    print(f"Tool latency: {latency['calls']} calls in {latency['turns']} turns, "
+                          f"{latency['sequential']:.2f}s sequential, {latency['critical_path']:.2f}s critical path")
+            span.set(answer=new_answer_content)
 
         return new_answer_content
 
@@ -0,0 +1,93 @@
+import os
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+
+import httpx
+from agno.models.openrouter import OpenRouter
+
+from resilience import resilient_model
+
+# --- Constants ---
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "32"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "600"))
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def shared_http_client() -> httpx.Client:
+    """
+    Returns the keep-alive HTTP client shared by every model of the process.
+
+    agno builds a new OpenAI client for every request unless it is given an http_client,
+    which means a new connection and TLS handshake per model call. httpx clients are
+    thread-safe, so one pooled client serves all agents and worker threads.
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                ),
+                timeout=HTTP_TIMEOUT,
+            )
+        return _http_client
+
+
+def openrouter_model(model_class=OpenRouter, **kwargs):
+    """
+    Builds an OpenRouter model (or subclass) that sends its requests over the shared HTTP client.
+
+    Calls go through the "openrouter" rate limit and retry policy of resilience.py, which
+    replaces the retries of the OpenAI SDK.
+    """
+    kwargs.setdefault("max_retries", 0)
+    return resilient_model(model_class(http_client=shared_http_client(), **kwargs), "openrouter")
+
+
+@lru_cache(maxsize=None)
+def read_prompt(path: str) -> str:
+    """Reads a prompt file once per process."""
+    return Path(path).read_text(encoding="utf-8")
+
+
+class AgentPool:
+    """
+    Thread-safe pool of interchangeable agents.
+
+    An agno agent must only run one call at a time, so callers borrow an idle agent for the
+    duration of a call and return it afterwards. New agents are built with `factory` only
+    when every existing one is busy, so the pool grows to the peak concurrency and no further.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.created = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            agent = self._idle.pop() if self._idle else None
+            if agent is None:
+                self.created += 1
+        if agent is None:
+            agent = self.factory()
+        try:
+            yield agent
+        finally:
+            with self._lock:
+                self._idle.append(agent)
+
+    def add(self, agent) -> None:
+        """Puts an already built agent into the pool."""
+        with self._lock:
+            self.created += 1
+            self._idle.append(agent)
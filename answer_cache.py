@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from hashing import file_sha256, text_sha256
+
+# --- Constants ---
+DEFAULT_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", str(Path(__file__).parent / "cache" / "answers.sqlite3"))
+# ANSWER_CACHE=0 disables reading and writing cached answers
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") != "0"
+# Answers older than this many days are evicted when the cache is opened, 0 keeps them forever
+ANSWER_CACHE_MAX_AGE_DAYS = float(os.getenv("ANSWER_CACHE_MAX_AGE_DAYS", "0"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    cache_key TEXT PRIMARY KEY,
+    task_id TEXT NOT NULL,
+    question TEXT NOT NULL,
+    file_hash TEXT,
+    fingerprint TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+class AnswerCache:
+    """
+    Disk-backed cache of submitted answers, stored in SQLite.
+
+    An answer is keyed on the task id, the question text, the content hash of the attached
+    file and the agent fingerprint (model id and system prompt hash), so changing any of them
+    makes the old answer unreachable. Answers are written as soon as they are produced, which
+    lets a crashed run resume where it stopped.
+    """
+
+    def __init__(self, fingerprint: str, path: str = DEFAULT_CACHE_PATH, max_age_days: float = ANSWER_CACHE_MAX_AGE_DAYS):
+        self.fingerprint = fingerprint
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_task_id ON answers (task_id)")
+
+        if max_age_days:
+            self.evict(max_age_seconds=max_age_days * 86400)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _key(self, task_id: str, question: str, file_hash: str) -> str:
+        return text_sha256(json.dumps([task_id, question, file_hash, self.fingerprint]))
+
+    def get(self, task_id: str, question: str, media_path=None) -> str:
+        """Returns the cached answer for a task, or None on a miss."""
+        key = self._key(task_id, question, file_sha256(media_path))
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT answer FROM answers WHERE cache_key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, task_id: str, question: str, media_path, answer: str) -> None:
+        file_hash = file_sha256(media_path)
+        key = self._key(task_id, question, file_hash)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, task_id, question, file_hash, self.fingerprint, answer, time.time()),
+            )
+
+    def invalidate(self, task_id: str) -> int:
+        """Removes every cached answer for a task. Returns the number of removed answers."""
+        with self._lock, self._connect() as conn:
+            return conn.execute("DELETE FROM answers WHERE task_id = ?", (task_id,)).rowcount
+
+    def evict(self, max_age_seconds: float = None, max_entries: int = None) -> int:
+        """
+        Removes answers older than `max_age_seconds` and, if `max_entries` is given, the oldest
+        answers beyond that count. Returns the number of removed answers.
+        """
+        removed = 0
+        with self._lock, self._connect() as conn:
+            if max_age_seconds is not None:
+                removed += conn.execute(
+                    "DELETE FROM answers WHERE created_at < ?", (time.time() - max_age_seconds,)
+                ).rowcount
+            if max_entries is not None:
+                removed += conn.execute(
+                    "DELETE FROM answers WHERE cache_key NOT IN "
+                    "(SELECT cache_key FROM answers ORDER BY created_at DESC LIMIT ?)",
+                    (max_entries,),
+                ).rowcount
+        return removed
+
+    def clear(self) -> int:
+        with self._lock, self._connect() as conn:
+            return conn.execute("DELETE FROM answers").rowcount
+
+    def __len__(self) -> int:
+        with self._lock, self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def summary(self) -> str:
+        return f"Answer cache: {self.hits} hits, {self.misses} misses"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and clean the persistent answer cache.")
+    parser.add_argument("--path", default=DEFAULT_CACHE_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Show the number of cached answers")
+    subparsers.add_parser("clear", help="Remove every cached answer")
+    invalidate_parser = subparsers.add_parser("invalidate", help="Remove the cached answers of a task")
+    invalidate_parser.add_argument("task_id")
+    evict_parser = subparsers.add_parser("evict", help="Remove old answers")
+    evict_parser.add_argument("--max-age-days", type=float)
+    evict_parser.add_argument("--max-entries", type=int)
+    args = parser.parse_args()
+
+    # The fingerprint only matters for lookups, maintenance commands work on every answer
+    cache = AnswerCache(fingerprint="", path=args.path, max_age_days=0)
+    if args.command == "stats":
+        print(f"{len(cache)} cached answers in {cache.path}")
+    elif args.command == "clear":
+        print(f"Removed {cache.clear()} answers")
+    elif args.command == "invalidate":
+        print(f"Removed {cache.invalidate(args.task_id)} answers for task {args.task_id}")
+    elif args.command == "evict":
+        max_age_seconds = args.max_age_days * 86400 if args.max_age_days is not None else None
+        print(f"Removed {cache.evict(max_age_seconds=max_age_seconds, max_entries=args.max_entries)} answers")
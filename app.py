@@ -1,208 +1,330 @@
+from __future__ import annotations
+
 import os
+import time
 from pathlib import Path
-import gradio as gr
 import requests
 import inspect
-import pandas as pd
 
-from agent import BasicAgent
+# gradio, pandas and the agent are imported on first use: gradio alone takes seconds to
+# import, and the headless mode and the pipeline never need it
+from answer_cache import ANSWER_CACHE_ENABLED, AnswerCache
+from resilience import resilience_report
+from tool_cache import TOOL_CACHE_ENABLED, get_tool_cache
+from tracing import trace_report
+from pipeline import (DEFAULT_API_URL, AnsweringInProgressError, RunManifest, agent_code_url, answer_questions, answering_cancelled,
+                      answering_in_progress, cancel_answering, fetch_questions, get_file_path, release_cancelled_run, resolve_media_path,
+                      start_background_answering, submit_answers)
 
 # (Keep Constants as is)
 # --- Constants ---
-DEFAULT_API_URL = "https://agents-course-unit4-scoring.hf.space"
-
-def get_file_path(file_id: str) -> Path:
-    """
-    Returns the absolute path to a file in the 'media_files' directory.
-
-    The file name is assumed to be of the format '<file_id>.*', and there's always
-    only one such file.
-
-    Args:
-        file_id: The ID of the file (e.g., '123').
-
-    Returns:
-        The absolute Path object for the file.
-    """
-    media_files_dir = Path(__file__).parent / 'media_files'
-    
-    # Use glob to find the file whose name contains the ID
-    matching_files = list(media_files_dir.glob(f'{file_id}.*'))
-
-    if not matching_files:
-        print(f"WARNING: No file found with ID '{file_id}' in '{media_files_dir}'")
-        return None
-
-    if len(matching_files) > 1:
-        print(f"WARNING: Multiple files found for ID '{file_id}': {matching_files}")
-        return None
-    
-    print(f"Found file: {matching_files[0]}")
-
-    return matching_files[0]
+ANSWERING_POLL_INTERVAL = 2
+
+def _answer_cache() -> AnswerCache:
+    from agent import agent_fingerprint
+
+    # Answers are cached on disk as they are produced, so a rerun only answers new or failed tasks
+    return AnswerCache(fingerprint=agent_fingerprint()) if ANSWER_CACHE_ENABLED else None
+
+def _progress_table(results: list) -> pd.DataFrame:
+    """Results in question order, with the latency of each task and whether its answer came from the cache."""
+    import pandas as pd
+
+    rows = []
+    for result in sorted(results, key=lambda r: r["index"]):
+        answer = result["answer"] if result["error"] is None else f"AGENT ERROR: {result['error']}"
+        rows.append({
+            "Task ID": result["task_id"],
+            "Question": result["question"],
+            "Submitted Answer": answer,
+            "Latency (s)": round(result.get("elapsed", 0.0), 1),
+            "Cache": "hit" if result.get("cached") else "miss",
+        })
+        if result.get("confidence") is not None:
+            rows[-1]["Confidence"] = round(result["confidence"], 2)
+    return pd.DataFrame(rows)
+
+def _progress_status(done: int, total: int, answered: int, start: float) -> str:
+    """`answered` counts the tasks the agent answered since `start`, cached and earlier answers do not predict the rest of the run."""
+    status = f"Answering... {done}/{total} questions done"
+    if answered and done < total:
+        eta = (time.time() - start) / answered * (total - done)
+        status += f", about {eta / 60:.1f} min left"
+    return status + "."
 
 def run_and_submit_all( profile: gr.OAuthProfile | None):
     """
     Fetches all questions, runs the BasicAgent on them, submits all answers,
     and displays the results.
+
+    Yields the status and the results table after every answered question, so the table
+    fills in while the run is going. The cancel button stops the run after the questions
+    in progress, and nothing is submitted then.
     """
     # --- Determine HF Space Runtime URL and Repo URL ---
-    space_id = os.getenv("SPACE_ID") # Get the SPACE_ID for sending link to the code
-
     if profile:
         username= f"{profile.username}"
         print(f"User logged in: {username}")
     else:
         print("User not logged in.")
-        return "Please Login to Hugging Face with the button.", None
+        yield "Please Login to Hugging Face with the button.", None
+        return
+    # A second run would answer the same tasks and overwrite the results of the first one
+    if answering_in_progress():
+        yield "Answering is already running in the background, wait for it to finish or cancel it.", None
+        return
 
     api_url = DEFAULT_API_URL
-    questions_url = f"{api_url}/questions"
-    submit_url = f"{api_url}/submit"
 
     # 1. Instantiate Agent ( modify this part to create your agent)
     try:
+        from agent import BasicAgent, agent_fingerprint
         agent = BasicAgent()
     except Exception as e:
         print(f"Error instantiating agent: {e}")
-        return f"Error initializing agent: {e}", None
-    # In the case of an app running as a hugging Face space, this link points toward your codebase ( usefull for others so please keep it public)
-    agent_code = f"https://huggingface.co/spaces/{space_id}/tree/main"
+        yield f"Error initializing agent: {e}", None
+        return
+    agent_code = agent_code_url()
     print(agent_code)
 
     # 2. Fetch Questions
-    print(f"Fetching questions from: {questions_url}")
-    try:
-        response = requests.get(questions_url, timeout=15)
-        response.raise_for_status()
-        questions_data = response.json()
-        if not questions_data:
-             print("Fetched questions list is empty.")
-             return "Fetched questions list is empty or invalid format.", None
-        print(f"Fetched {len(questions_data)} questions.")
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching questions: {e}")
-        return f"Error fetching questions: {e}", None
-    except requests.exceptions.JSONDecodeError as e:
-         print(f"Error decoding JSON response from questions endpoint: {e}")
-         print(f"Response text: {response.text[:500]}")
-         return f"Error decoding server response for questions: {e}", None
-    except Exception as e:
-        print(f"An unexpected error occurred fetching questions: {e}")
-        return f"An unexpected error occurred fetching questions: {e}", None
+    manifest = RunManifest()
+    questions_data, error = fetch_questions(manifest, api_url)
+    if error:
+        yield error, None
+        return
 
     # 3. Run your Agent
-    results_log = []
-    answers_payload = []
-    print(f"Running agent on {len(questions_data)} questions...")
-    counter = 1
-    for item in questions_data:
-        print(f"Processing question {counter}/{len(questions_data)}")
-        counter += 1
-
-        task_id = item.get("task_id")
-        question_text = item.get("question")
-        file_name = item.get("file_name")
-        if not task_id or question_text is None:
-            print(f"Skipping item with missing task_id or question: {item}")
-            continue
-        try:
-            media_path = None
-            if 'https' in question_text or '.' in file_name:
-                media_path = get_file_path(task_id)
-
-            submitted_answer = agent(question_text, media_path)
-            answers_payload.append({"task_id": task_id, "submitted_answer": submitted_answer})
-            results_log.append({"Task ID": task_id, "Question": question_text, "Submitted Answer": submitted_answer})
-        except Exception as e:
-             print(f"Error running agent on task {task_id}: {e}")
-             results_log.append({"Task ID": task_id, "Question": question_text, "Submitted Answer": f"AGENT ERROR: {e}"})
-
-    if not answers_payload:
-        print("Agent did not produce any answers to submit.")
-        return "Agent did not produce any answers to submit.", pd.DataFrame(results_log)
-
-    # 4. Prepare Submission 
-    submission_data = {"username": username.strip(), "agent_code": agent_code, "answers": answers_payload}
-    status_update = f"Agent finished. Submitting {len(answers_payload)} answers for user '{username}'..."
-    print(status_update)
-
-    # 5. Submit
-    print(f"Submitting {len(answers_payload)} answers to: {submit_url}")
+    cache = _answer_cache()
+    # Answers of a different model, prompt or routing configuration are answered again
+    manifest.set_fingerprint(agent_fingerprint())
+    results = [result for result in manifest.snapshot() if result["error"] is None]
+    answered = 0
+    start = time.time()
+    yield _progress_status(len(results), len(questions_data), answered, start), _progress_table(results)
     try:
-        response = requests.post(submit_url, json=submission_data, timeout=60)
-        response.raise_for_status()
-        result_data = response.json()
-        final_status = (
-            f"Submission Successful!\n"
-            f"User: {result_data.get('username')}\n"
-            f"Overall Score: {result_data.get('score', 'N/A')}% "
-            f"({result_data.get('correct_count', '?')}/{result_data.get('total_attempted', '?')} correct)\n"
-            f"Message: {result_data.get('message', 'No message received.')}"
-        )
-        print("Submission successful.")
-        results_df = pd.DataFrame(results_log)
-        return final_status, results_df
-    except requests.exceptions.HTTPError as e:
-        error_detail = f"Server responded with status {e.response.status_code}."
-        try:
-            error_json = e.response.json()
-            error_detail += f" Detail: {error_json.get('detail', e.response.text)}"
-        except requests.exceptions.JSONDecodeError:
-            error_detail += f" Response: {e.response.text[:500]}"
-        status_message = f"Submission Failed: {error_detail}"
-        print(status_message)
-        results_df = pd.DataFrame(results_log)
-        return status_message, results_df
-    except requests.exceptions.Timeout:
-        status_message = "Submission Failed: The request timed out."
-        print(status_message)
-        results_df = pd.DataFrame(results_log)
-        return status_message, results_df
-    except requests.exceptions.RequestException as e:
-        status_message = f"Submission Failed: Network error - {e}"
-        print(status_message)
-        results_df = pd.DataFrame(results_log)
-        return status_message, results_df
-    except Exception as e:
-        status_message = f"An unexpected error occurred during submission: {e}"
-        print(status_message)
-        results_df = pd.DataFrame(results_log)
-        return status_message, results_df
+        for result in answer_questions(manifest, agent=agent, cache=cache):
+            results.append(result)
+            answered += not result["cached"]
+            yield _progress_status(len(results), len(questions_data), answered, start), _progress_table(results)
+    except AnsweringInProgressError:
+        yield "Answering is already running in the background, wait for it to finish or cancel it.", None
+        return
+    if answering_cancelled():
+        yield f"Run cancelled after {len(results)}/{len(questions_data)} questions, nothing was submitted.", _progress_table(results)
+        return
+    cache_status = f"{cache.summary()}\n" if cache is not None else ""
+    if TOOL_CACHE_ENABLED:
+        cache_status += f"Tool cache:\n{get_tool_cache().report()}\n"
+    cache_status += f"Providers:\n{resilience_report()}\n"
+    print(cache_status)
+
+    # 4. Submit
+    status_message = submit_answers(manifest, username, agent_code, api_url)
+    yield cache_status + status_message, _progress_table(manifest.snapshot())
+
+def cancel_run():
+    cancel_answering()
+    release_cancelled_run()
+    return "Cancelling, the questions in progress finish first and the rest stay unanswered."
+
+def fetch_stage():
+    """Fetches the questions into the run manifest and lists them."""
+    import pandas as pd
+
+    if answering_in_progress():
+        return "Answering is still running, wait for it to finish before fetching again.", None
+    manifest = RunManifest()
+    questions_data, error = fetch_questions(manifest)
+    if error:
+        return error, None
+    answered = manifest.answered_task_ids()
+    status = f"Fetched {len(questions_data)} questions, {len(answered)} already answered."
+    return status, pd.DataFrame(
+        [{"Task ID": item.get("task_id"), "Question": item.get("question")} for item in questions_data]
+    )
+
+def answer_stage():
+    """
+    Answers the fetched questions on a background thread and streams the manifest into
+    the results table until the background run finishes.
+    """
+    manifest = RunManifest()
+    if not manifest.questions:
+        yield "No questions fetched yet, fetch the questions first.", None
+        return
+
+    from agent import agent_fingerprint
+
+    cache = _answer_cache()
+    if answering_in_progress():
+        yield "Answering is already running in the background.", None
+        return
+    manifest.set_fingerprint(agent_fingerprint())
+    if not start_background_answering(manifest, cache=cache):
+        yield "Answering is already running in the background.", None
+        return
+
+    done_before = len(manifest.answered_task_ids())
+    start = time.time()
+    while answering_in_progress():
+        results = manifest.snapshot()
+        done = sum(result["error"] is None for result in results)
+        yield _progress_status(done, len(manifest.questions), done - done_before, start), _progress_table(results)
+        time.sleep(ANSWERING_POLL_INTERVAL)
+
+    answers_payload, _ = manifest.collect()
+    status = "Answering cancelled." if answering_cancelled() else "Answering finished."
+    status += f" {len(answers_payload)}/{len(manifest.questions)} questions answered."
+    if cache is not None:
+        status += f"\n{cache.summary()}"
+    if TOOL_CACHE_ENABLED:
+        status += f"\nTool cache:\n{get_tool_cache().report()}"
+    status += f"\nProviders:\n{resilience_report()}"
+    yield status, _progress_table(manifest.snapshot())
+
+def submit_stage(profile: gr.OAuthProfile | None):
+    """Submits the answers stored in the run manifest."""
+    import pandas as pd
+
+    if not profile:
+        print("User not logged in.")
+        return "Please Login to Hugging Face with the button.", None
+    if answering_in_progress():
+        return "Answering is still running, wait for it to finish before submitting.", None
+
+    from agent import agent_fingerprint
+
+    manifest = RunManifest()
+    fingerprint = agent_fingerprint()
+    if manifest.fingerprint != fingerprint or manifest.stale_task_ids(fingerprint):
+        return "The stored answers do not match the fetched questions or the current agent, answer the questions again before submitting.", None
+    _, results_log = manifest.collect()
+    status_message = submit_answers(manifest, profile.username, agent_code_url())
+    return status_message, pd.DataFrame(results_log)
 
 
 # --- Build Gradio Interface using Blocks ---
-with gr.Blocks() as demo:
-    gr.Markdown("# Basic Agent Evaluation Runner")
-    gr.Markdown(
-        """
-        **Instructions:**
-
-        1.  Please clone this space, then modify the code to define your agent's logic, the tools, the necessary packages, etc ...
-        2.  Log in to your Hugging Face account using the button below. This uses your HF username for submission.
-        3.  Click 'Run Evaluation & Submit All Answers' to fetch questions, run your agent, submit answers, and see the score.
-
-        ---
-        **Disclaimers:**
-        Once clicking on the "submit button, it can take quite some time ( this is the time for the agent to go through all the questions).
-        This space provides a basic setup and is intentionally sub-optimal to encourage you to develop your own, more robust solution. For instance for the delay process of the submit button, a solution could be to cache the answers and submit in a seperate action or even to answer the questions in async.
-        """
-    )
+def build_demo():
+    """Imports gradio and builds the interface, `app.demo` calls this on first access."""
+    # The handlers' `gr.OAuthProfile` annotations are resolved by gradio when they are called,
+    # so gradio is bound as a module global
+    global gr
+    import gradio as gr
+
+    with gr.Blocks() as demo:
+        gr.Markdown("# Basic Agent Evaluation Runner")
+        gr.Markdown(
+            """
+            **Instructions:**
+
+            1.  Please clone this space, then modify the code to define your agent's logic, the tools, the necessary packages, etc ...
+            2.  Log in to your Hugging Face account using the button below. This uses your HF username for submission.
+            3.  Click 'Run Evaluation & Submit All Answers' to fetch questions, run your agent, submit answers, and see the score.
+                Alternatively run the stages one by one: 'Fetch Questions', 'Answer Questions' (runs in the background and can be resumed) and 'Submit Answers' (submits the stored answers).
+
+            ---
+            **Disclaimers:**
+            Once clicking on the "submit button, it can take quite some time ( this is the time for the agent to go through all the questions).
+            This space provides a basic setup and is intentionally sub-optimal to encourage you to develop your own, more robust solution. For instance for the delay process of the submit button, a solution could be to cache the answers and submit in a seperate action or even to answer the questions in async.
+            """
+        )
 
-    gr.LoginButton()
+        gr.LoginButton()
 
-    run_button = gr.Button("Run Evaluation & Submit All Answers")
+        with gr.Row():
+            run_button = gr.Button("Run Evaluation & Submit All Answers")
+            cancel_button = gr.Button("Cancel Run", variant="stop")
 
-    status_output = gr.Textbox(label="Run Status / Submission Result", lines=5, interactive=False)
-    # Removed max_rows=10 from DataFrame constructor
-    results_table = gr.DataFrame(label="Questions and Agent Answers", wrap=True)
+        with gr.Row():
+            fetch_button = gr.Button("1. Fetch Questions")
+            answer_button = gr.Button("2. Answer Questions")
+            submit_button = gr.Button("3. Submit Answers")
 
-    run_button.click(
-        fn=run_and_submit_all,
-        outputs=[status_output, results_table]
-    )
+        status_output = gr.Textbox(label="Run Status / Submission Result", lines=5, interactive=False)
+        with gr.Row():
+            # Removed max_rows=10 from DataFrame constructor
+            results_table = gr.DataFrame(label="Questions and Agent Answers", wrap=True, scale=3)
+            trace_output = gr.Textbox(label="Trace Report", lines=15, interactive=False, scale=1)
+
+        run_event = run_button.click(
+            fn=run_and_submit_all,
+            outputs=[status_output, results_table]
+        )
+        fetch_button.click(
+            fn=fetch_stage,
+            outputs=[status_output, results_table]
+        )
+        answer_event = answer_button.click(
+            fn=answer_stage,
+            outputs=[status_output, results_table]
+        )
+        # Stops the streaming callbacks and the agent run behind them, the questions in progress still finish
+        cancel_button.click(
+            fn=cancel_run,
+            outputs=[status_output],
+            cancels=[run_event, answer_event]
+        ).then(
+            fn=lambda: trace_report(),
+            outputs=[trace_output]
+        )
+        submit_button.click(
+            fn=submit_stage,
+            outputs=[status_output, results_table]
+        )
+        # The trace report of the run is built once when answering stops, not for every progress update
+        for event in (run_event, answer_event):
+            event.then(
+                fn=lambda: trace_report(),
+                outputs=[trace_output]
+            )
+    return demo
+
+_demo = None
+
+def __getattr__(name):
+    # `demo` is built on first access, so importing app for its functions stays fast
+    global _demo
+    if name == "demo":
+        if _demo is None:
+            _demo = build_demo()
+        return _demo
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def run_headless(args) -> None:
+    """Fetches the questions, answers them in sharded worker processes and optionally submits, without the UI."""
+    from sharding import run_sharded
+
+    manifest = RunManifest()
+    if not args.rerun_failed:
+        questions_data, error = fetch_questions(manifest)
+        if error:
+            raise SystemExit(error)
+    print(run_sharded(manifest, count=args.shards, concurrency=args.concurrency,
+                      task_timeout=args.task_timeout, rerun_failed=args.rerun_failed))
+    if args.submit:
+        if not args.username:
+            raise SystemExit("--username or HF_USERNAME is needed to submit")
+        print(submit_answers(manifest, args.username, agent_code_url()))
 
 if __name__ == "__main__":
+    import argparse
+    from runner import DEFAULT_CONCURRENCY, DEFAULT_TASK_TIMEOUT
+    from sharding import DEFAULT_SHARDS
+
+    parser = argparse.ArgumentParser(description="Basic Agent Evaluation Runner")
+    parser.add_argument("--headless", action="store_true", help="Answer the questions in worker processes instead of launching the UI")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS, help="Number of worker processes")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Questions answered at the same time per worker")
+    parser.add_argument("--task-timeout", type=float, default=DEFAULT_TASK_TIMEOUT)
+    parser.add_argument("--rerun-failed", action="store_true", help="Only rerun the shards of the last run with unanswered questions")
+    parser.add_argument("--submit", action="store_true", help="Submit the merged answers when done")
+    parser.add_argument("--username", default=os.getenv("HF_USERNAME"))
+    args = parser.parse_args()
+    if args.headless:
+        run_headless(args)
+        raise SystemExit(0)
+
     print("\n" + "-"*30 + " App Starting " + "-"*30)
     # Check for SPACE_HOST and SPACE_ID at startup for information
     space_host_startup = os.getenv("SPACE_HOST")
@@ -224,4 +346,5 @@ if __name__ == "__main__":
     print("-"*(60 + len(" App Starting ")) + "\n")
 
     print("Launching Gradio Interface for Basic Agent Evaluation...")
-    demo.launch(debug=True, share=False)
\ No newline at end of file
+    # Queueing is needed for streaming results and cancelling runs, one run at a time
+    build_demo().queue(default_concurrency_limit=1).launch(debug=True, share=False)
\ No newline at end of file
@@ -0,0 +1,234 @@
+"""
+Index of the question attachments in the media_files directory.
+
+Every attachment is stored as '<task_id>.<ext>'. The index maps each task id to the file's
+path, size, modification time, content hash and media type. It is built once with a single
+directory scan, persisted next to the other caches, and updated per file when a stat shows
+the file changed, so content hashes are only computed for new or modified files. A lookup
+that misses rescans the directory if its modification time changed, so files copied in
+while the app runs are found too.
+"""
+import json
+import os
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from hashing import file_sha256, remember_file_sha256
+
+# --- Constants ---
+MEDIA_FILES_DIR = Path(os.getenv("MEDIA_FILES_DIR", str(Path(__file__).parent / "media_files")))
+ATTACHMENT_INDEX_PATH = Path(os.getenv("ATTACHMENT_INDEX_PATH", str(Path(__file__).parent / "cache" / "attachments.json")))
+ATTACHMENT_DOWNLOAD_CONCURRENCY = int(os.getenv("ATTACHMENT_DOWNLOAD_CONCURRENCY", "4"))
+ATTACHMENT_DOWNLOAD_TIMEOUT = float(os.getenv("ATTACHMENT_DOWNLOAD_TIMEOUT", "60"))
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp", ".tiff"}
+AUDIO_EXTS = {".mp3", ".wav", ".m4a", ".flac", ".ogg"}
+VIDEO_EXTS = {".mp4", ".mov", ".mkv", ".avi", ".webm"}
+CODE_EXTS = {".py", ".js", ".json", ".html", ".css", ".java", ".c", ".cpp", ".cs", ".rb", ".go", ".rs", ".ts"}
+SPREADSHEET_EXTS = {".xlsx", ".xls", ".csv", ".tsv"}
+TEXT_EXTS = {".txt", ".md", ".pdf", ".docx"}
+
+
+def detect_media_type(path: str) -> str:
+    ext = pathlib.Path(path).suffix.lower()
+    if ext in IMAGE_EXTS:
+        return "image"
+    if ext in AUDIO_EXTS:
+        return "audio"
+    if ext in VIDEO_EXTS:
+        return "video"
+    if ext in CODE_EXTS:
+        return "code"
+    if ext in SPREADSHEET_EXTS:
+        return "spreadsheet"
+    if ext in TEXT_EXTS:
+        return "text"
+
+    return "file"
+
+
+class AttachmentStore:
+    """
+    Thread-safe task id -> attachment index over one directory.
+
+    Lookups stat the indexed file and rehash it only when its size or modification time
+    changed. Missing attachments can be downloaded from the scoring API in parallel.
+    """
+
+    def __init__(self, directory: Path = MEDIA_FILES_DIR, index_path: Path = ATTACHMENT_INDEX_PATH):
+        self.directory = Path(directory)
+        self.index_path = Path(index_path) if index_path else None
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._scanned_mtime_ns = None
+        self._load()
+
+    def _load(self) -> None:
+        stored = {}
+        if self.index_path and self.index_path.exists():
+            try:
+                stored = json.loads(self.index_path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Error reading attachment index {self.index_path}, rebuilding it: {e}")
+        self._scan(stored)
+
+    def _directory_mtime_ns(self) -> int:
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return None
+
+    def _scan(self, stored: dict) -> None:
+        """Indexes the files of the directory that are not indexed yet, reusing the `stored` entries that are still valid."""
+        with self._scan_lock:
+            # Taken before the scan, a file added during the scan triggers another one
+            self._scanned_mtime_ns = self._directory_mtime_ns()
+            if self._scanned_mtime_ns is None:
+                return
+            files = {}
+            with os.scandir(self.directory) as scan:
+                for dir_entry in scan:
+                    # Unfinished downloads end in .part
+                    if dir_entry.is_file() and "." in dir_entry.name and not dir_entry.name.endswith(".part"):
+                        files.setdefault(dir_entry.name.split(".", 1)[0], []).append(dir_entry)
+            with self._lock:
+                indexed = set(self.entries)
+            added = {}
+            for task_id, dir_entries in files.items():
+                if task_id in indexed:
+                    continue
+                if len(dir_entries) > 1:
+                    print(f"WARNING: Multiple files found for ID '{task_id}': {[dir_entry.path for dir_entry in dir_entries]}")
+                    continue
+                added[task_id] = self._entry(Path(dir_entries[0].path), dir_entries[0].stat(), stored.get(task_id))
+            with self._lock:
+                for task_id, entry in added.items():
+                    self.entries.setdefault(task_id, entry)
+        self._save()
+
+    def _rescan_if_changed(self) -> None:
+        if self._directory_mtime_ns() != self._scanned_mtime_ns:
+            self._scan({})
+
+    def _entry(self, path: Path, stat: os.stat_result, previous: dict = None) -> dict:
+        if previous and previous.get("path") == str(path) and previous.get("size") == stat.st_size \
+                and previous.get("mtime_ns") == stat.st_mtime_ns:
+            # Unchanged since it was indexed, the stored hash is still valid
+            remember_file_sha256(path, stat, previous["sha256"])
+            return previous
+        return {
+            "path": str(path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_sha256(path),
+            "media_type": detect_media_type(path),
+        }
+
+    def _save(self) -> None:
+        if not self.index_path:
+            return
+        # Snapshots are written in order, so a slow writer never replaces a newer index
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps(self.entries, indent=2)
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(".tmp")
+            tmp_path.write_text(data, encoding="utf-8")
+            os.replace(tmp_path, self.index_path)
+
+    def get(self, task_id: str) -> dict:
+        """Returns the index entry of a task's attachment, or None if it has none on disk."""
+        with self._lock:
+            entry = self.entries.get(task_id)
+        if entry is None:
+            self._rescan_if_changed()
+            with self._lock:
+                entry = self.entries.get(task_id)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(entry["path"])
+        except OSError:
+            with self._lock:
+                self.entries.pop(task_id, None)
+            self._save()
+            return None
+        if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+            return entry
+        # The file was replaced or modified since it was indexed
+        entry = self._entry(Path(entry["path"]), stat)
+        with self._lock:
+            self.entries[task_id] = entry
+        self._save()
+        return entry
+
+    def path(self, task_id: str) -> Path:
+        entry = self.get(task_id)
+        return Path(entry["path"]) if entry else None
+
+    def add(self, task_id: str, path: Path) -> dict:
+        path = Path(path)
+        entry = self._entry(path, os.stat(path))
+        with self._lock:
+            self.entries[task_id] = entry
+        self._save()
+        return entry
+
+    def download(self, task_id: str, file_name: str, api_url: str) -> dict:
+        """Downloads a task's attachment from `{api_url}/files/{task_id}` into the directory and indexes it."""
+        suffix = Path(file_name).suffix if file_name else ""
+        path = self.directory / f"{task_id}{suffix}"
+        tmp_path = path.with_name(f"{path.name}.part")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with requests.get(f"{api_url}/files/{task_id}", stream=True, timeout=ATTACHMENT_DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+        os.replace(tmp_path, path)
+        print(f"Downloaded attachment {path.name}")
+        return self.add(task_id, path)
+
+    def download_missing(self, questions_data: list, api_url: str, concurrency: int = ATTACHMENT_DOWNLOAD_CONCURRENCY) -> list:
+        """
+        Downloads the attachments of the questions that name a file but have none on disk.
+
+        Returns:
+            list: Error messages of the failed downloads.
+        """
+        missing = [
+            item for item in questions_data
+            if item.get("file_name") and item.get("task_id") and self.get(item["task_id"]) is None
+        ]
+        if not missing:
+            return []
+        print(f"Downloading {len(missing)} attachments (concurrency={concurrency})...")
+
+        def download(item):
+            try:
+                self.download(item["task_id"], item["file_name"], api_url)
+                return None
+            except Exception as e:
+                print(f"Error downloading attachment of task {item['task_id']}: {e}")
+                return f"{item['task_id']}: {e}"
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="attachment-download") as executor:
+            return [error for error in executor.map(download, missing) if error]
+
+
+_attachment_store = None
+_attachment_store_lock = threading.Lock()
+
+
+def get_attachment_store() -> AttachmentStore:
+    global _attachment_store
+    with _attachment_store_lock:
+        if _attachment_store is None:
+            _attachment_store = AttachmentStore()
+        return _attachment_store
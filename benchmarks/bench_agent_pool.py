@@ -0,0 +1,105 @@
+"""
+Microbenchmark for per-call agent overhead.
+
+Serves a fake OpenAI-compatible chat completions endpoint on localhost and measures the
+time of one media-agent call when a new agent and HTTP connection are built for every call
+(the old media_agent_tool behaviour) versus borrowing an agent from an AgentPool whose
+model uses the shared keep-alive HTTP client. Without an http_client agno builds a new
+OpenAI client for every request, and each new httpx client loads a fresh SSL context, which
+dominates the per-call overhead even on plain HTTP. Over TLS to OpenRouter every new
+connection also pays a handshake.
+
+Usage:
+    python benchmarks/bench_agent_pool.py --calls 50
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+os.environ.setdefault("AGNO_TELEMETRY", "false")
+# The benchmark measures the pool, not the OpenRouter rate limit
+os.environ.setdefault("RATE_LIMIT_OPENROUTER", "0")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agno.agent import Agent
+from agno.models.openrouter import OpenRouter
+
+from agent_pool import AgentPool, openrouter_model
+
+COMPLETION = json.dumps({
+    "id": "stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub-model",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "42"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode("utf-8")
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    connections = set()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        CompletionHandler.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, *args):
+        pass
+
+
+def _time_calls(calls, run_call):
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        run_call()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    def new_agent_per_call():
+        agent = Agent(model=OpenRouter(id="stub-model", api_key="stub", base_url=base_url))
+        agent.run("What is in the image?")
+
+    pool = AgentPool(lambda: Agent(model=openrouter_model(id="stub-model", api_key="stub", base_url=base_url)))
+
+    def pooled_agent():
+        with pool.acquire() as agent:
+            agent.run("What is in the image?")
+
+    for label, run_call in (("new agent per call", new_agent_per_call), ("pooled agent", pooled_agent)):
+        CompletionHandler.connections.clear()
+        run_call()  # warm up imports and the pool
+        timings = _time_calls(args.calls, run_call)
+        print(
+            f"{label:<19} median {statistics.median(timings) * 1000:.2f}ms, "
+            f"p95 {sorted(timings)[int(len(timings) * 0.95) - 1] * 1000:.2f}ms, "
+            f"{len(CompletionHandler.connections)} connections"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Local benchmark for the question runner.
+
+Runs the real BasicAgent against a stub model that sleeps instead of calling OpenRouter,
+once with the original sequential loop and once on the thread pool, and reports the
+wall-clock speedup. No network access or API key is needed.
+
+Usage:
+    python benchmarks/bench_concurrency.py --questions 20 --latency 0.5 --concurrency 8
+"""
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+os.environ.setdefault("AGNO_TELEMETRY", "false")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agno.models.openrouter import OpenRouter
+from agno.models.response import ModelResponse
+
+from agent import BasicAgent
+from runner import collect_results, iter_answers
+
+
+@dataclass
+class StubModel(OpenRouter):
+    """OpenRouter model that answers every prompt with a fixed string after a fixed delay."""
+
+    id: str = "stub-model"
+    api_key: str = "stub"
+    latency: float = 0.5
+    answer: str = "42"
+
+    def invoke(self, messages, assistant_message, **kwargs) -> ModelResponse:
+        assistant_message.metrics.start_timer()
+        time.sleep(self.latency)
+        assistant_message.metrics.stop_timer()
+        return ModelResponse(role="assistant", content=self.answer)
+
+
+def _run(questions_data, latency, concurrency):
+    start = time.perf_counter()
+    answers_payload, results_log = collect_results(
+        iter_answers(
+            questions_data,
+            lambda: BasicAgent(model=StubModel(latency=latency)),
+            lambda item: None,
+            concurrency=concurrency,
+            task_timeout=None,
+        )
+    )
+    return time.perf_counter() - start, answers_payload, results_log
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated model latency in seconds")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    questions_data = [
+        {"task_id": f"task-{i}", "question": f"Stub question {i}", "file_name": ""}
+        for i in range(args.questions)
+    ]
+
+    sequential_time, sequential_answers, sequential_log = _run(questions_data, args.latency, 1)
+    concurrent_time, concurrent_answers, concurrent_log = _run(questions_data, args.latency, args.concurrency)
+
+    assert sequential_answers == concurrent_answers, "answers_payload differs between modes"
+    assert sequential_log == concurrent_log, "results_log differs between modes"
+
+    print(f"questions:      {args.questions}")
+    print(f"model latency:  {args.latency:.2f}s")
+    print(f"concurrency:    {args.concurrency}")
+    print(f"sequential:     {sequential_time:.2f}s")
+    print(f"concurrent:     {concurrent_time:.2f}s")
+    print(f"speedup:        {sequential_time / concurrent_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Local benchmark for parallel tool-call dispatch.
+
+A stub model requests several slow, independent tool calls in its first turn and answers
+in its second. The same question is run with agno's sequential dispatch and with
+ParallelToolsOpenRouter, and the per-question critical-path latency of both is reported.
+No network access or API key is needed.
+
+Usage:
+    python benchmarks/bench_parallel_tools.py --tool-calls 4 --tool-latency 0.5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+os.environ.setdefault("AGNO_TELEMETRY", "false")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agno.agent import Agent
+from agno.models.openrouter import OpenRouter
+from agno.models.response import ModelResponse
+
+from parallel_tools import ParallelToolsOpenRouter
+
+
+@dataclass
+class StubToolCallingModel(ParallelToolsOpenRouter):
+    """Requests `tool_calls` lookups in the first turn and answers once their results are in."""
+
+    id: str = "stub-model"
+    api_key: str = "stub"
+    tool_calls: int = 4
+    parallel: bool = True
+
+    def invoke(self, messages, assistant_message, **kwargs) -> ModelResponse:
+        assistant_message.metrics.start_timer()
+        assistant_message.metrics.stop_timer()
+        if any(message.role == "tool" for message in messages):
+            results = [message.content for message in messages if message.role == "tool"]
+            return ModelResponse(role="assistant", content=",".join(results))
+        return ModelResponse(
+            role="assistant",
+            tool_calls=[
+                {
+                    "id": f"call_{i}",
+                    "type": "function",
+                    "function": {"name": "slow_lookup", "arguments": json.dumps({"query": f"topic {i}"})},
+                }
+                for i in range(self.tool_calls)
+            ],
+        )
+
+    def run_function_calls(self, *args, **kwargs):
+        if self.parallel:
+            yield from super().run_function_calls(*args, **kwargs)
+        else:
+            start = time.perf_counter()
+            yield from OpenRouter.run_function_calls(self, *args, **kwargs)
+            self._record_turn([time.perf_counter() - start])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tool-calls", type=int, default=4)
+    parser.add_argument("--tool-latency", type=float, default=0.5, help="Simulated latency of every tool call in seconds")
+    args = parser.parse_args()
+
+    def slow_lookup(query: str) -> str:
+        """Looks up a topic."""
+        time.sleep(args.tool_latency)
+        return query.upper()
+
+    answers = {}
+    for parallel in (False, True):
+        model = StubToolCallingModel(tool_calls=args.tool_calls, parallel=parallel)
+        model.reset_tool_latency()
+        agent = Agent(model=model, tools=[slow_lookup])
+        start = time.perf_counter()
+        answers[parallel] = agent.run("Look up every topic").content
+        elapsed = time.perf_counter() - start
+        label = "parallel" if parallel else "sequential"
+        print(f"{label:<11} question {elapsed:.2f}s, tool critical path {model.tool_latency['critical_path']:.2f}s")
+
+    assert answers[False] == answers[True], "tool results came back in a different order"
+    print(f"answer:     {answers[True]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Offline benchmark of the full agent on recorded interactions.
+
+Record a run once (this calls OpenRouter, Google, Wikipedia and arXiv):
+    REPLAY_MODE=record python pipeline.py fetch
+    REPLAY_MODE=record python pipeline.py answer
+
+Recording bypasses the answer cache and the answers already in the manifest, so every
+question is answered and recorded.
+
+Then replay it as often as needed, without network access or API costs:
+    python benchmarks/bench_replay.py --concurrency 1 4 8 --latency-scale 1.0
+
+The answer and tool caches are disabled so every run does the same work. For every
+concurrency level the benchmark reports questions/sec, p50/p95 latency per stage (task,
+agent run, model call, each tool) from the trace spans, and the peak resident memory.
+With --json the numbers are written to a file, and with --baseline a previous file is
+compared against, exiting with status 1 when throughput dropped by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+os.environ.setdefault("AGNO_TELEMETRY", "false")
+os.environ["REPLAY_MODE"] = "replay"
+os.environ["TOOL_CACHE"] = "0"
+os.environ["ANSWER_CACHE"] = "0"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import tracing
+from pipeline import DEFAULT_API_URL, RunManifest, fetch_questions, resolve_media_path
+from replay import get_replay_store
+from runner import collect_results, iter_answers
+
+
+def _stage_latencies(spans: list) -> dict:
+    durations = defaultdict(list)
+    for span in spans:
+        name = span["name"]
+        if name == "tool.call":
+            name = f"tool {span['attributes'].get('tool')}"
+        durations[name].append(span["duration"])
+    return {
+        name: {
+            "count": len(values),
+            "p50": tracing.percentile(values, 0.5),
+            "p95": tracing.percentile(values, 0.95),
+        }
+        for name, values in sorted(durations.items())
+    }
+
+
+def _run(questions_data: list, concurrency: int) -> dict:
+    from agent import BasicAgent
+
+    trace_path = Path(tempfile.mkdtemp(prefix="bench-replay-")) / "traces.jsonl"
+    tracing.tracer.path = trace_path
+    start = time.perf_counter()
+    answers_payload, results_log = collect_results(
+        iter_answers(questions_data, BasicAgent, resolve_media_path, concurrency=concurrency, task_timeout=None)
+    )
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for row in results_log if str(row["Submitted Answer"]).startswith("AGENT ERROR"))
+    return {
+        "concurrency": concurrency,
+        "questions": len(questions_data),
+        "errors": errors,
+        "seconds": elapsed,
+        "questions_per_second": len(questions_data) / elapsed if elapsed else 0.0,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stages": _stage_latencies(tracing.load_spans(trace_path)),
+        "answers": {answer["task_id"]: answer["submitted_answer"] for answer in answers_payload},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1])
+    parser.add_argument("--latency-scale", type=float, default=0.0, help="Multiplier of the recorded latency of every call")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fixed seconds added to every replayed call")
+    parser.add_argument("--limit", type=int, default=None, help="Only run the first N questions")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file of an earlier run to compare throughput against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative throughput drop against the baseline")
+    args = parser.parse_args()
+
+    store = get_replay_store()
+    store.latency_scale = args.latency_scale
+    store.latency = args.latency
+
+    questions_data, error = fetch_questions(RunManifest(Path(tempfile.mkdtemp()) / "manifest.json"), DEFAULT_API_URL)
+    if error:
+        sys.exit(error)
+    questions_data = questions_data[:args.limit]
+
+    runs = [_run(questions_data, concurrency) for concurrency in args.concurrency]
+
+    for run in runs:
+        print(f"\nconcurrency {run['concurrency']}: {run['questions']} questions in {run['seconds']:.2f}s, "
+              f"{run['questions_per_second']:.2f} questions/s, {run['errors']} errors, peak RSS {run['max_rss_mb']:.0f} MB")
+        for name, stage in run["stages"].items():
+            print(f"  {name:<40} {stage['count']:>5} calls  p50 {stage['p50']:.3f}s  p95 {stage['p95']:.3f}s")
+
+    if any(run["answers"] != runs[0]["answers"] for run in runs):
+        print("\nWARNING: replayed answers differ between concurrency levels")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(runs, indent=2), encoding="utf-8")
+        print(f"\nWrote {args.json}")
+
+    if args.baseline:
+        baseline = {run["concurrency"]: run for run in json.loads(Path(args.baseline).read_text(encoding="utf-8"))}
+        regressed = False
+        for run in runs:
+            previous = baseline.get(run["concurrency"])
+            if previous is None:
+                continue
+            change = run["questions_per_second"] / previous["questions_per_second"] - 1
+            print(f"concurrency {run['concurrency']}: {change:+.0%} questions/s against the baseline")
+            regressed = regressed or change < -args.tolerance
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
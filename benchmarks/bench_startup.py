@@ -0,0 +1,98 @@
+"""
+Cold start profile of the app and the agent.
+
+Every scenario runs in a fresh Python process, so nothing is shared with earlier imports:
+
+    import app        - importing app.py, what the UI and the headless mode pay before doing anything
+    import pipeline   - the fetch and submit CLI stages
+    import agent      - the agent module with its prompts and tools
+    first agent       - importing agent.py and building the BasicAgent that answers the first question
+
+For each scenario the median wall time over --repeat runs is reported, followed by the
+modules with the largest cumulative import time (from `python -X importtime`) of the slowest
+scenario, which shows what to defer next.
+
+Usage:
+    python benchmarks/bench_startup.py --repeat 5 --top 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SCENARIOS = {
+    "import app": "import app",
+    "import pipeline": "import pipeline",
+    "import agent": "import agent",
+    "first agent": "import agent; agent.BasicAgent()",
+}
+
+_TIMER = (
+    "import sys, time; sys.path.insert(0, {root!r}); start = time.perf_counter(); {code}; "
+    "print('STARTUP_SECONDS', time.perf_counter() - start)"
+)
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("AGNO_TELEMETRY", "false")
+    # Building agents needs a key, no request is sent
+    env.setdefault("OPENROUTER_API_KEY", "benchmark")
+    return env
+
+
+def _run(code: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", _TIMER.format(root=str(ROOT), code=code)]
+    return subprocess.run(command, capture_output=True, text=True, cwd=ROOT, env=_env(), check=True)
+
+
+def measure(code: str, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        output = _run(code).stdout
+        times.append(float(output.rsplit("STARTUP_SECONDS", 1)[1].split()[0]))
+    return statistics.median(times)
+
+
+def import_breakdown(code: str, top: int) -> list:
+    """Returns (module, cumulative seconds) of the `top` slowest imports of `code`, two levels deep."""
+    modules = []
+    for line in _run(code, importtime=True).stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Only the scenario's modules and their direct imports, deeper ones are part of their cumulative time
+        if len(name) - len(name.lstrip()) <= 3:
+            modules.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(modules, key=lambda module: module[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="Number of modules in the import breakdown")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    results = {name: measure(code, args.repeat) for name, code in SCENARIOS.items()}
+    for name, seconds in results.items():
+        print(f"{name:<20} {seconds:.3f}s")
+
+    slowest = max(results, key=results.get)
+    breakdown = import_breakdown(SCENARIOS[slowest], args.top)
+    print(f"\nSlowest imports of '{slowest}' (cumulative):")
+    for module, seconds in breakdown:
+        print(f"  {module:<40} {seconds:.3f}s")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"scenarios": results, "breakdown": breakdown}, indent=2), encoding="utf-8")
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
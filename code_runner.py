@@ -0,0 +1,177 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from hashing import file_sha256
+from tool_cache import TOOL_CACHE_ENABLED, get_tool_cache
+
+# --- Constants ---
+CODE_TIMEOUT = float(os.getenv("CODE_TIMEOUT", "10"))
+CODE_CPU_SECONDS = int(os.getenv("CODE_CPU_SECONDS", "10"))
+CODE_MEMORY_MB = int(os.getenv("CODE_MEMORY_MB", "512"))
+CODE_MAX_OUTPUT_CHARS = int(os.getenv("CODE_MAX_OUTPUT_CHARS", "4000"))
+# Processes the sandboxed script may run at the same time across all agents
+CODE_CONCURRENCY = int(os.getenv("CODE_CONCURRENCY", "2"))
+
+_slots = threading.BoundedSemaphore(CODE_CONCURRENCY)
+
+# The directory of this repository, which holds the .env file and the code of the agent
+_REPO_DIR = Path(__file__).resolve().parent
+
+# Runs in the child before the script: limits its resources, installs audit hooks and then
+# executes the script as __main__. The limits are set here rather than in preexec_fn, which is
+# not safe to use while other threads are running. Audit hooks cannot be removed by the script,
+# and unlike replacing socket.socket they keep ssl, asyncio and urllib importable.
+_PRELUDE = """
+import os, runpy, sys
+script, cpu_seconds, memory, guard_network, workdir, protected = sys.argv[1:7]
+try:
+    import resource
+except ImportError:
+    resource = None
+if resource is not None:
+    resource.setrlimit(resource.RLIMIT_CPU, (int(cpu_seconds), int(cpu_seconds)))
+    resource.setrlimit(resource.RLIMIT_AS, (int(memory), int(memory)))
+    # Scripts may write small scratch files to their directory, nothing bigger
+    resource.setrlimit(resource.RLIMIT_FSIZE, (16 * 1024 * 1024, 16 * 1024 * 1024))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+NETWORK_EVENTS = {"socket.connect", "socket.getaddrinfo", "socket.gethostbyname", "socket.sendto", "socket.sendmsg"}
+PATH_EVENTS = {"os.remove", "os.rename", "os.rmdir", "os.truncate", "os.chmod", "os.chown", "os.link", "os.symlink", "shutil.rmtree"}
+WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_APPEND | os.O_TRUNC
+
+def _inside(path, directory):
+    try:
+        path = os.path.realpath(os.fsdecode(path))
+    except (TypeError, ValueError):
+        return False
+    return path == directory or path.startswith(directory + os.sep)
+
+def _writable(path):
+    return _inside(path, workdir) or _inside(path, "/dev")
+
+def _guard(event, args):
+    if guard_network == "1" and event in NETWORK_EVENTS:
+        raise PermissionError("Network access is disabled in the sandbox")
+    if event == "open" and not isinstance(args[0], int):
+        path, mode, flags = args
+        if _inside(path, protected):
+            raise PermissionError(f"Access to {path} is not allowed in the sandbox")
+        writing = (mode is not None and any(c in mode for c in "wax+")) or (flags or 0) & WRITE_FLAGS
+        if writing and not _writable(path):
+            raise PermissionError(f"Writing outside the working directory is not allowed in the sandbox: {path}")
+    elif event in PATH_EVENTS:
+        paths = [arg for arg in args[:2] if isinstance(arg, (str, bytes, os.PathLike))]
+        if not all(_writable(path) for path in paths):
+            raise PermissionError(f"Changing files outside the working directory is not allowed in the sandbox: {paths}")
+
+sys.addaudithook(_guard)
+sys.argv = [script]
+runpy.run_path(script, run_name="__main__")
+"""
+
+
+@lru_cache(maxsize=None)
+def _network_namespace() -> tuple:
+    """
+    Returns the command prefix that runs a process in its own empty network namespace, or ()
+    where unprivileged namespaces are not available (non-Linux systems, restricted containers).
+    """
+    unshare = shutil.which("unshare")
+    prefixes = ((unshare, "--net"), (unshare, "--map-root-user", "--net")) if unshare else ()
+    for prefix in prefixes:
+        try:
+            subprocess.run([*prefix, "true"], stdin=subprocess.DEVNULL, capture_output=True, timeout=5, check=True)
+            return prefix
+        except (OSError, subprocess.SubprocessError):
+            continue
+    print("WARNING: Network namespaces are not available, code execution only blocks network access with an audit hook")
+    return ()
+
+
+def _truncate(text: str) -> str:
+    if len(text) <= CODE_MAX_OUTPUT_CHARS:
+        return text
+    return text[:CODE_MAX_OUTPUT_CHARS] + f"\n... ({len(text) - CODE_MAX_OUTPUT_CHARS} more characters not shown)"
+
+
+def run_python(path: str, timeout: float = CODE_TIMEOUT) -> str:
+    """
+    Runs a Python file in a restricted subprocess and returns its output.
+
+    The file is copied into an empty temporary directory that becomes the working directory
+    and the temporary directory of the script, and the interpreter runs in isolated mode with
+    an environment that holds no API keys. CPU time, memory and written file size are limited
+    on POSIX systems.
+
+    On Linux the process and everything it starts run in an empty network namespace
+    (`unshare --net`), where no connection can be made. Elsewhere an audit hook rejects
+    connections and name lookups of the script itself.
+
+    There is no filesystem isolation: audit hooks keep the script from reading this
+    repository (including .env) and from writing outside its working directory, but they are
+    best-effort and do not cover processes the script starts, which run with the permissions
+    of the app. Only run attachments of the evaluation questions, not arbitrary code.
+    """
+    namespace = _network_namespace()
+    with _slots, tempfile.TemporaryDirectory(prefix="sandbox-") as workdir:
+        script = Path(workdir) / Path(path).name
+        shutil.copyfile(path, script)
+        try:
+            completed = subprocess.run(
+                [*namespace, sys.executable, "-I", "-B", "-c", _PRELUDE, str(script),
+                 str(CODE_CPU_SECONDS), str(CODE_MEMORY_MB * 1024 * 1024),
+                 # The namespace already blocks the network, the audit hook is only the fallback
+                 "0" if namespace else "1", os.path.realpath(workdir), str(_REPO_DIR)],
+                cwd=workdir,
+                env={"PATH": os.defpath, "PYTHONIOENCODING": "utf-8", "HOME": workdir, "TMPDIR": workdir},
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                text=True,
+                errors="replace",
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired as e:
+            stdout = e.stdout.decode("utf-8", "replace") if isinstance(e.stdout, bytes) else e.stdout or ""
+            return f"Execution timed out after {timeout:g} seconds\nstdout:\n{_truncate(stdout)}"
+
+    result = f"Exit code: {completed.returncode}\nstdout:\n{_truncate(completed.stdout)}"
+    if completed.stderr:
+        result += f"\nstderr:\n{_truncate(completed.stderr)}"
+    return result
+
+
+def CodeExecutionTool(file_path: str = "") -> str:
+    """Use this tool to run an attached Python file and get its exact output, instead of reasoning about what it prints.
+
+    Args:
+        file_path: The exact local path to the Python file.
+
+    Returns:
+        str: The exit code, stdout and stderr of the program, or 'file not found' if the file doesn't exist.
+    """
+
+    if not file_path or not Path(file_path).exists():
+        return 'file not found'
+    if Path(file_path).suffix.lower() != ".py":
+        return 'only Python files can be executed'
+
+    print(f"CodeExecution received file_path: {file_path}")
+    # Runs are cached by file content, the same attachment is only executed once
+    cache = get_tool_cache() if TOOL_CACHE_ENABLED else None
+    key = cache.key("CodeExecutionTool", {"file_hash": file_sha256(file_path)}) if cache else None
+    result = cache.get(key) if cache else None
+    if result is None:
+        result = run_python(str(file_path))
+        if cache and not result.startswith("Execution timed out"):
+            cache.put(key, "CodeExecutionTool", {"file_path": str(file_path)}, result)
+    else:
+        print("CodeExecution cache hit")
+
+    print(f"CodeExecution got result: {result[:200]}")
+    return result
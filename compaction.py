@@ -0,0 +1,166 @@
+"""
+Compaction of tool outputs before they enter an agent's message history.
+
+Every tool result stays in the history of a question and is resent with each later model
+turn, so a few full Wikipedia pages make every turn expensive. `compact_tool_hook` cuts
+long results down to the excerpt that is most relevant to the question, ranked locally with
+BM25, and the budget of each result shrinks as the question's tool outputs add up, so the
+input tokens grow sub-linearly with the number of tool calls and never pass a ceiling.
+"""
+import contextvars
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from ranking import BM25
+from tokens import CHARS_PER_TOKEN, estimate_tokens
+from tracing import current_span
+
+# --- Constants ---
+# COMPACTION=0 keeps tool outputs whole
+COMPACTION_ENABLED = os.getenv("COMPACTION", "1") != "0"
+# Largest tool output kept whole, in tokens
+TOOL_OUTPUT_TOKENS = int(os.getenv("TOOL_OUTPUT_TOKENS", "1500"))
+# Ceiling of the tool output tokens of one question, each output gets at most half of what is left
+QUESTION_TOOL_TOKENS = int(os.getenv("QUESTION_TOOL_TOKENS", "12000"))
+# Below this budget an output is not worth excerpting any more
+MIN_EXCERPT_TOKENS = int(os.getenv("MIN_EXCERPT_TOKENS", "150"))
+EXCERPT_CHUNK_TOKENS = 100
+
+
+class QuestionBudget:
+    """The tool output tokens one question has left, shared by its parallel tool calls."""
+
+    def __init__(self, question: str, ceiling: int = QUESTION_TOOL_TOKENS):
+        self.question = question
+        self.ceiling = ceiling
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> int:
+        """Returns how many of `tokens` the next output may use, and books them."""
+        with self._lock:
+            allowed = min(tokens, TOOL_OUTPUT_TOKENS, (self.ceiling - self.used) // 2)
+            allowed = max(allowed, 0)
+            self.used += allowed
+            return allowed
+
+    def release(self, tokens: int) -> None:
+        with self._lock:
+            self.used -= tokens
+
+
+_budget = contextvars.ContextVar("question_budget", default=None)
+
+
+@contextmanager
+def question_budget(question: str):
+    """Tool outputs of everything called inside the block are compacted against `question`."""
+    token = _budget.set(QuestionBudget(question))
+    try:
+        yield _budget.get()
+    finally:
+        _budget.reset(token)
+
+
+def _lines(text: str):
+    # Tools often return JSON on a single line, long lines are cut at spaces into chunk sized pieces
+    width = EXCERPT_CHUNK_TOKENS * CHARS_PER_TOKEN
+    for line in text.splitlines():
+        while len(line) > width:
+            cut = line.rfind(" ", width // 2, width)
+            cut = cut if cut > 0 else width
+            yield line[:cut]
+            line = line[cut:]
+        yield line
+
+
+def _chunks(text: str) -> list:
+    """Splits text into consecutive pieces of about EXCERPT_CHUNK_TOKENS tokens, on line boundaries."""
+    chunks = []
+    current = []
+    size = 0
+    for line in _lines(text):
+        tokens = estimate_tokens(line)
+        if current and size + tokens > EXCERPT_CHUNK_TOKENS:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def excerpt(text: str, query: str, budget: int) -> str:
+    """
+    Returns the parts of `text` that best match `query`, in their original order, within
+    `budget` tokens. Skipped parts are marked with [...].
+    """
+    chunks = _chunks(text)
+    ranking = BM25(chunks)
+    ranked = ranking.top(query, len(chunks))
+    # Chunks without any matching term follow in text order, the beginning is the best guess
+    matched = set(ranked)
+    ranked += [i for i in range(len(chunks)) if i not in matched]
+    kept = []
+    used = 0
+    for i in ranked:
+        tokens = estimate_tokens(chunks[i])
+        if used + tokens > budget:
+            continue
+        kept.append(i)
+        used += tokens
+    parts = []
+    previous = -1
+    for i in sorted(kept):
+        if i != previous + 1:
+            parts.append("[...]")
+        parts.append(chunks[i])
+        previous = i
+    if previous != len(chunks) - 1:
+        parts.append("[...]")
+    return "\n".join(parts)
+
+
+def compaction_fingerprint() -> str:
+    """Identifies the compaction settings, since they change what the model sees of every tool output."""
+    return f"compaction={TOOL_OUTPUT_TOKENS}/{QUESTION_TOOL_TOKENS}" if COMPACTION_ENABLED else "compaction=off"
+
+
+def compact_tool_hook(function_name: str, function_call, arguments: dict):
+    """
+    agno tool hook replacing long tool outputs with their excerpt most relevant to the question.
+
+    Outputs of tools called outside of `question_budget` are passed through unchanged.
+    """
+    result = function_call(**arguments)
+    budget = _budget.get()
+    if not COMPACTION_ENABLED or budget is None or not isinstance(result, str):
+        return result
+
+    tokens = estimate_tokens(result)
+    allowed = budget.reserve(tokens)
+    if allowed >= tokens:
+        return result
+    span = current_span()
+    if allowed < MIN_EXCERPT_TOKENS:
+        budget.release(allowed)
+        if span is not None:
+            span.set(original_tokens=tokens, kept_tokens=0)
+        print(f"Compaction: dropped {tokens} tokens of {function_name} output, the question's tool budget is used up")
+        return (
+            f"[{function_name} returned {tokens} tokens, which were left out because this question's tool output "
+            "budget is used up. Answer with the information gathered so far.]"
+        )
+
+    query = f"{budget.question} {json.dumps(arguments, default=str)}"
+    compacted = excerpt(result, query, allowed)
+    kept = estimate_tokens(compacted)
+    # Unused reservations go back to the question
+    budget.release(max(0, allowed - kept))
+    if span is not None:
+        span.set(original_tokens=tokens, kept_tokens=kept)
+    print(f"Compaction: {function_name} output cut from {tokens} to {kept} tokens")
+    return f"[Excerpt of {kept} of {tokens} tokens, the parts most relevant to the question]\n{compacted}"
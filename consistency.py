@@ -0,0 +1,121 @@
+import contextvars
+import math
+import os
+import re
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# --- Constants ---
+# SELF_CONSISTENCY_SAMPLES=1 keeps one agent run per question
+SELF_CONSISTENCY_SAMPLES = int(os.getenv("SELF_CONSISTENCY_SAMPLES", "1"))
+# Fraction of the samples that must agree before the remaining samples are skipped
+SELF_CONSISTENCY_THRESHOLD = float(os.getenv("SELF_CONSISTENCY_THRESHOLD", "0.5"))
+# Samples at the default temperature of 0.05 are nearly identical, votes need some diversity
+SELF_CONSISTENCY_TEMPERATURE = float(os.getenv("SELF_CONSISTENCY_TEMPERATURE", "0.7"))
+
+_NUMBER = re.compile(r"^[-+]?\$?\d{1,3}(,\d{3})+(\.\d+)?$|^[-+]?\$?\d+(\.\d+)?$")
+
+
+def _normalize_item(item: str) -> str:
+    item = " ".join(item.split()).strip(" \"'`*")
+    item = item.rstrip(".!;:")
+    if _NUMBER.match(item):
+        # 1,000 / $1000 / 1000.0 are the same number
+        number = item.replace(",", "").replace("$", "")
+        if "." in number:
+            number = number.rstrip("0").rstrip(".")
+        return number
+    return item.casefold()
+
+
+def normalize_answer(answer: str) -> str:
+    """
+    Normalizes a short answer for voting: case, surrounding quotes and whitespace, trailing
+    punctuation, number formatting, and the spacing of comma separated lists are ignored.
+    """
+    answer = str(answer or "").strip()
+    if answer.lower().startswith("final answer:"):
+        answer = answer[len("final answer:"):]
+    if _NUMBER.match(answer.strip().rstrip(".")):
+        return _normalize_item(answer)
+    return ", ".join(_normalize_item(item) for item in answer.split(","))
+
+
+class Vote:
+    """Counts normalized answers, keeping the first raw form of each as the one to submit."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.raw = {}
+
+    def add(self, answer: str) -> None:
+        key = normalize_answer(answer)
+        self.counts[key] += 1
+        self.raw.setdefault(key, answer)
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def leader(self) -> tuple:
+        """Returns (raw answer, votes) of the most common answer, the earliest one on ties."""
+        if not self.counts:
+            return None, 0
+        key, votes = self.counts.most_common(1)[0]
+        return self.raw[key], votes
+
+
+def self_consistent_answer(run_sample, samples: int = SELF_CONSISTENCY_SAMPLES,
+                           threshold: float = SELF_CONSISTENCY_THRESHOLD) -> tuple:
+    """
+    Answers a question by majority vote over up to `samples` concurrent agent runs.
+
+    `run_sample(index)` runs one sample and returns its answer. Only as many samples run at
+    a time as the current leading answer still needs to win, so a question whose first
+    samples agree costs `required` runs instead of `samples`. Voting stops as soon as an
+    answer has more than `threshold * samples` votes, or when no answer can reach that any more.
+
+    Returns:
+        tuple: (answer, confidence, runs), confidence is the share of the finished runs
+        that agree with the answer.
+    """
+    required = math.floor(threshold * samples) + 1
+    vote = Vote()
+    errors = []
+    executor = ThreadPoolExecutor(max_workers=max(1, samples), thread_name_prefix="sample")
+    pending = set()
+    started = 0
+    try:
+        while True:
+            _, votes = vote.leader()
+            finished = vote.total + len(errors)
+            if votes >= required or votes + samples - finished < required:
+                break
+            # Top up the running samples to what the leading answer still needs
+            needed = min(required - votes, samples - started) - len(pending)
+            for _ in range(max(0, needed)):
+                pending.add(executor.submit(contextvars.copy_context().run, run_sample, started))
+                started += 1
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    answer = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if answer is None or str(answer).startswith("AGENT ERROR"):
+                    errors.append(answer)
+                else:
+                    vote.add(answer)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    answer, votes = vote.leader()
+    if answer is None:
+        if errors and isinstance(errors[-1], Exception):
+            raise errors[-1]
+        return (errors[-1] if errors else None), 0.0, started
+    print(f"Self-consistency: {votes}/{vote.total} samples agree on {answer!r} after {started} runs")
+    return answer, votes / vote.total, started
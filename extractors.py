@@ -0,0 +1,226 @@
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from pathlib import Path
+from xml.etree import ElementTree
+
+from hashing import file_sha256
+from ranking import BM25
+from tokens import estimate_tokens
+
+# --- Constants ---
+# Attachments up to this many tokens are pasted into the prompt in full
+ATTACHMENT_TOKEN_BUDGET = int(os.getenv("ATTACHMENT_TOKEN_BUDGET", "6000"))
+# Indexing stops after this many characters, so huge files cannot exhaust memory
+ATTACHMENT_MAX_INDEX_CHARS = int(os.getenv("ATTACHMENT_MAX_INDEX_CHARS", str(50 * 1024 * 1024)))
+LINES_PER_CHUNK = 50
+ROWS_PER_CHUNK = 100
+PARAGRAPHS_PER_CHUNK = 20
+BINARY_SNIFF_BYTES = 8192
+
+_WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class Chunk:
+    def __init__(self, label: str, text: str):
+        self.label = label
+        self.text = text
+
+    def render(self) -> str:
+        return f"[{self.label}]\n{self.text}"
+
+
+def _is_binary(path: str) -> bool:
+    with open(path, "rb") as f:
+        return b"\0" in f.read(BINARY_SNIFF_BYTES)
+
+
+def extract_lines(path: str):
+    """Streams a text or code file in blocks of LINES_PER_CHUNK lines."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        lines = []
+        start = 1
+        for number, line in enumerate(f, start=1):
+            lines.append(line)
+            if len(lines) == LINES_PER_CHUNK:
+                yield Chunk(f"lines {start}-{number}", "".join(lines))
+                lines = []
+                start = number + 1
+        if lines:
+            yield Chunk(f"lines {start}-{start + len(lines) - 1}", "".join(lines))
+
+
+def extract_pdf(path: str):
+    """Streams a PDF page by page."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):
+        yield Chunk(f"page {number}/{len(reader.pages)}", page.extract_text() or "")
+
+
+def extract_docx(path: str):
+    """Streams the paragraphs of a Word document in blocks of PARAGRAPHS_PER_CHUNK."""
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as document:
+        paragraphs = []
+        start = 1
+        for _, element in ElementTree.iterparse(document):
+            if element.tag != f"{_WORD_NAMESPACE}p":
+                continue
+            paragraphs.append("".join(node.text or "" for node in element.iter(f"{_WORD_NAMESPACE}t")))
+            element.clear()
+            if len(paragraphs) == PARAGRAPHS_PER_CHUNK:
+                yield Chunk(f"paragraphs {start}-{start + len(paragraphs) - 1}", "\n".join(paragraphs))
+                start += len(paragraphs)
+                paragraphs = []
+        if paragraphs:
+            yield Chunk(f"paragraphs {start}-{start + len(paragraphs) - 1}", "\n".join(paragraphs))
+
+
+def extract_csv(path: str):
+    """Streams a CSV or TSV file in blocks of ROWS_PER_CHUNK rows, repeating the header in every block."""
+    import pandas as pd
+
+    separator = "\t" if Path(path).suffix.lower() == ".tsv" else ","
+    start = 1
+    for frame in pd.read_csv(path, sep=separator, chunksize=ROWS_PER_CHUNK):
+        yield Chunk(f"rows {start}-{start + len(frame) - 1}", frame.to_csv(index=False))
+        start += len(frame)
+
+
+def extract_legacy_excel(path: str):
+    """Streams every sheet of a workbook through pandas, for old .xls files (xlrd) and installs without openpyxl."""
+    import pandas as pd
+
+    for sheet, frame in pd.read_excel(path, sheet_name=None).items():
+        for start in range(0, len(frame), ROWS_PER_CHUNK):
+            block = frame.iloc[start:start + ROWS_PER_CHUNK]
+            yield Chunk(f"sheet {sheet} rows {start + 1}-{start + len(block)}", block.to_csv(index=False))
+
+
+def extract_excel(path: str):
+    """Streams every sheet of a workbook in blocks of ROWS_PER_CHUNK rows, repeating the header in every block."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        yield from extract_legacy_excel(path)
+        return
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            header_line = ",".join("" if value is None else str(value) for value in header)
+            block = []
+            start = 1
+            for row in rows:
+                block.append(",".join("" if value is None else str(value) for value in row))
+                if len(block) == ROWS_PER_CHUNK:
+                    yield Chunk(f"sheet {sheet.title} rows {start}-{start + len(block) - 1}", "\n".join([header_line, *block]))
+                    start += len(block)
+                    block = []
+            if block or start == 1:
+                yield Chunk(f"sheet {sheet.title} rows {start}-{start + len(block) - 1}", "\n".join([header_line, *block]))
+    finally:
+        workbook.close()
+
+
+def extract_file(path: str):
+    """Streams unknown files as text, unless they look binary."""
+    if _is_binary(path):
+        yield Chunk("binary", f"Binary file of {os.path.getsize(path)} bytes, its content cannot be shown as text.")
+        return
+    yield from extract_lines(path)
+
+
+# Extractors keyed on the media type from attachments.detect_media_type, with per-extension overrides
+EXTRACTORS = {
+    "text": extract_lines,
+    "code": extract_lines,
+    "spreadsheet": extract_csv,
+    "file": extract_file,
+}
+EXTENSION_EXTRACTORS = {
+    ".pdf": extract_pdf,
+    ".docx": extract_docx,
+    ".xlsx": extract_excel,
+    # openpyxl cannot read the old binary format
+    ".xls": extract_legacy_excel,
+}
+
+
+def iter_chunks(path: str, media_type: str):
+    extractor = EXTENSION_EXTRACTORS.get(Path(path).suffix.lower()) or EXTRACTORS.get(media_type, extract_file)
+    return extractor(str(path))
+
+
+def extract_for_prompt(path: str, media_type: str, token_budget: int = ATTACHMENT_TOKEN_BUDGET) -> tuple[str, bool]:
+    """
+    Returns the content of an attachment to paste into the prompt and whether it was truncated.
+
+    Chunks are streamed until `token_budget` is spent, so only the part of the file that fits
+    into the prompt is ever read. Truncated content ends with a note telling the agent to use
+    AttachmentSearchTool for the rest.
+    """
+    parts = []
+    used = 0
+    for chunk in iter_chunks(path, media_type):
+        rendered = chunk.render()
+        tokens = estimate_tokens(rendered)
+        if used + tokens > token_budget:
+            if not parts:
+                # The first chunk alone is over the budget, so paste as much of it as fits
+                rendered = rendered[:len(rendered) * token_budget // tokens]
+                parts.append(rendered)
+                used = estimate_tokens(rendered)
+            parts.append(
+                f"[Attachment truncated after {used} tokens. The file is at {path}, "
+                f"call AttachmentSearchTool with this path and a query to read the relevant parts.]"
+            )
+            return "\n".join(parts), True
+        parts.append(rendered)
+        used += tokens
+    return "\n".join(parts), False
+
+
+class ChunkIndex:
+    """BM25 index over the chunks of one attachment."""
+
+    def __init__(self, path: str, media_type: str):
+        self.chunks = []
+        size = 0
+        for chunk in iter_chunks(path, media_type):
+            self.chunks.append(chunk)
+            size += len(chunk.text)
+            if size > ATTACHMENT_MAX_INDEX_CHARS:
+                print(f"WARNING: Indexed only the first {size} characters of {path}")
+                break
+        self.bm25 = BM25([f"{chunk.label}\n{chunk.text}" for chunk in self.chunks])
+
+    def search(self, query: str, max_chunks: int) -> list:
+        return [self.chunks[i] for i in self.bm25.top(query, max_chunks)]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+MAX_CACHED_INDEXES = 8
+
+
+def get_chunk_index(path: str, media_type: str) -> ChunkIndex:
+    """Returns the chunk index of a file, built once per content hash."""
+    key = file_sha256(path)
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+
+    index = ChunkIndex(path, media_type)
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,46 @@
+import hashlib
+import os
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path) -> str:
+    """
+    Returns the sha256 hex digest of a file's content, or None if the file doesn't exist.
+
+    Digests are memoized per (path, size, mtime), so unchanged files are only read once.
+    """
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        if key in _file_hashes:
+            return _file_hashes[key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    with _file_hashes_lock:
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+
+def remember_file_sha256(path, stat: os.stat_result, digest: str) -> None:
+    """Records a known digest of a file, so `file_sha256` does not read the file while it is unchanged."""
+    with _file_hashes_lock:
+        _file_hashes[(str(path), stat.st_size, stat.st_mtime_ns)] = digest
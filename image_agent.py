@@ -4,6 +4,8 @@ from agno.agent import Agent, RunOutput
 from dotenv import load_dotenv
 from agno.media import Image
 
+from agent_pool import openrouter_model
+
 load_dotenv()
 
 openrouter_api_key = os.environ.get("OPENROUTER_API_KEY")
@@ -12,7 +14,7 @@ image_agent_model_id="openrouter/sonoma-dusk-alpha"
 
 def create_media_agent():
     media_agent = Agent(
-        model=OpenRouter(
+        model=openrouter_model(
             api_key=openrouter_api_key,
             id=image_agent_model_id,
             temperature=0.0,
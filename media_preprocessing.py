@@ -0,0 +1,237 @@
+import base64
+import importlib.util
+import io
+import mimetypes
+import os
+import threading
+from pathlib import Path
+
+from agno.media import Audio, Image, Video
+
+from hashing import file_sha256
+
+# --- Constants ---
+# Vision models tile images down to about 2048px on the long side and 768px on the short side,
+# anything larger is uploaded and billed for nothing
+MEDIA_IMAGE_MAX_SIDE = int(os.getenv("MEDIA_IMAGE_MAX_SIDE", "2048"))
+MEDIA_IMAGE_MAX_SHORT_SIDE = int(os.getenv("MEDIA_IMAGE_MAX_SHORT_SIDE", "768"))
+MEDIA_JPEG_QUALITY = int(os.getenv("MEDIA_JPEG_QUALITY", "85"))
+# MEDIA_TRANSCRIBE=0 sends audio files to the model instead of a local transcript
+MEDIA_TRANSCRIBE = os.getenv("MEDIA_TRANSCRIBE", "1") != "0"
+MEDIA_WHISPER_MODEL = os.getenv("MEDIA_WHISPER_MODEL", "base")
+TRANSCRIPT_CACHE_DIR = Path(os.getenv("TRANSCRIPT_CACHE_DIR", str(Path(__file__).parent / "cache" / "transcripts")))
+# Frames sent for a video, picked among VIDEO_CANDIDATE_FRAMES evenly spaced frames
+VIDEO_KEYFRAMES = int(os.getenv("VIDEO_KEYFRAMES", "8"))
+VIDEO_CANDIDATE_FRAMES = int(os.getenv("VIDEO_CANDIDATE_FRAMES", "32"))
+VIDEO_FRAME_MAX_SIDE = int(os.getenv("VIDEO_FRAME_MAX_SIDE", "768"))
+
+# Formats of drawings, screenshots and diagrams, where JPEG artifacts blur text and lines
+LOSSLESS_FORMATS = {"PNG", "GIF", "BMP", "TIFF"}
+
+_whisper_model = None
+_whisper_lock = threading.Lock()
+
+
+class PreparedMedia:
+    """
+    What the media agent receives for a file: agno media objects, and text that is put in
+    front of the question (a transcript, or the timestamps of video frames).
+    """
+
+    def __init__(self, images: list = None, audio: list = None, videos: list = None, context: str = ""):
+        self.images = images or None
+        self.audio = audio or None
+        self.videos = videos or None
+        self.context = context
+
+
+def _data_url(content: bytes, mime_type: str) -> str:
+    return f"data:{mime_type};base64,{base64.b64encode(content).decode('utf-8')}"
+
+
+def _fit(width: int, height: int, max_side: int, max_short_side: int = None) -> float:
+    scale = min(1.0, max_side / max(width, height))
+    if max_short_side:
+        scale = min(scale, max_short_side / min(width, height))
+    return scale
+
+
+def _resize(image, scale: float):
+    if scale >= 1.0:
+        return image
+    from PIL import Image as PILImage
+
+    return image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), PILImage.LANCZOS)
+
+
+def _encode_image(image, lossless: bool) -> tuple[bytes, str]:
+    from PIL import Image as PILImage
+
+    buffer = io.BytesIO()
+    if lossless:
+        image.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue(), "image/png"
+    if image.mode not in ("RGB", "L"):
+        # JPEG has no alpha channel, transparent areas become white
+        background = PILImage.new("RGB", image.size, "white")
+        background.paste(image.convert("RGBA"), mask=image.convert("RGBA").getchannel("A"))
+        image = background
+    image.save(buffer, format="JPEG", quality=MEDIA_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue(), "image/jpeg"
+
+
+def downscale_image(media_path: str) -> tuple[bytes, str]:
+    """
+    Returns the image bytes and mime type to send for an image file.
+
+    Images larger than the model's useful resolution are resized, photos are re-encoded as
+    JPEG and drawings or screenshots as PNG. The original file is sent when that is smaller.
+    """
+    from PIL import Image as PILImage, ImageOps
+
+    original = Path(media_path).read_bytes()
+    with PILImage.open(io.BytesIO(original)) as opened:
+        lossless = opened.format in LOSSLESS_FORMATS
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+    scale = _fit(image.width, image.height, MEDIA_IMAGE_MAX_SIDE, MEDIA_IMAGE_MAX_SHORT_SIDE)
+    image = _resize(image, scale)
+    content, mime_type = _encode_image(image, lossless)
+    if scale == 1.0 and len(content) >= len(original):
+        return original, mimetypes.guess_type(media_path)[0] or "image/png"
+    print(f"MediaPreprocessing image {media_path}: {len(original) // 1024} KB -> {len(content) // 1024} KB")
+    return content, mime_type
+
+
+def _load_whisper():
+    global _whisper_model
+    with _whisper_lock:
+        if _whisper_model is None:
+            from faster_whisper import WhisperModel
+
+            _whisper_model = WhisperModel(MEDIA_WHISPER_MODEL, device="cpu", compute_type="int8")
+        return _whisper_model
+
+
+def _timestamp(seconds: float) -> str:
+    return f"{int(seconds // 60)}:{int(seconds % 60):02d}"
+
+
+def transcribe_audio(media_path: str, file_hash: str = None) -> str:
+    """
+    Transcribes an audio file on the CPU with faster-whisper, with a timestamp per segment.
+
+    Transcripts are stored by file hash and model, so every file is transcribed once.
+    Returns None when transcription is disabled or faster-whisper is not installed.
+    """
+    if not MEDIA_TRANSCRIBE:
+        return None
+    file_hash = file_hash or file_sha256(media_path)
+    cache_path = TRANSCRIPT_CACHE_DIR / f"{file_hash}.{MEDIA_WHISPER_MODEL}.txt"
+    if cache_path.exists():
+        return cache_path.read_text(encoding="utf-8")
+
+    try:
+        model = _load_whisper()
+    except ImportError:
+        print("MediaPreprocessing: faster-whisper is not installed, sending the audio file instead")
+        return None
+    segments, _ = model.transcribe(str(media_path), vad_filter=True)
+    transcript = "\n".join(f"[{_timestamp(segment.start)}] {segment.text.strip()}" for segment in segments)
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".tmp")
+    tmp_path.write_text(transcript, encoding="utf-8")
+    os.replace(tmp_path, cache_path)
+    print(f"MediaPreprocessing transcribed {media_path}: {len(transcript)} characters")
+    return transcript
+
+
+def _pick_keyframes(signatures: list, count: int) -> list:
+    """Indexes of the first frame and of the `count - 1` frames that differ most from the frame before them."""
+    if len(signatures) <= count:
+        return list(range(len(signatures)))
+    changes = [
+        (sum(abs(a - b) for a, b in zip(signatures[i], signatures[i - 1])), i)
+        for i in range(1, len(signatures))
+    ]
+    picked = [i for _, i in sorted(changes, reverse=True)[:count - 1]]
+    return sorted([0] + picked)
+
+
+def keyframes_available() -> bool:
+    """True when OpenCV is installed, so videos are sent as keyframes instead of the whole file."""
+    return importlib.util.find_spec("cv2") is not None
+
+
+def sample_keyframes(media_path: str, count: int = VIDEO_KEYFRAMES) -> list:
+    """
+    Samples the keyframes of a video with OpenCV.
+
+    Evenly spaced candidate frames are decoded, and the ones where the picture changes most
+    are kept, so a mostly static video does not use its frames on identical shots.
+
+    Returns:
+        list: (seconds, JPEG bytes) pairs in time order, or None when OpenCV is not installed.
+    """
+    try:
+        import cv2
+    except ImportError:
+        print("MediaPreprocessing: opencv is not installed, sending the video file instead")
+        return None
+    from PIL import Image as PILImage
+
+    capture = cv2.VideoCapture(str(media_path))
+    try:
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        candidates = min(max(count, VIDEO_CANDIDATE_FRAMES), max(frame_count, 1))
+        frames = []
+        for i in range(candidates):
+            position = int(i * frame_count / candidates)
+            capture.set(cv2.CAP_PROP_POS_FRAMES, position)
+            ok, frame = capture.read()
+            if ok:
+                # Candidates are shrunk right away, full resolution frames would take hundreds of MB
+                image = PILImage.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                frames.append((position / fps, _resize(image, _fit(image.width, image.height, VIDEO_FRAME_MAX_SIDE))))
+    finally:
+        capture.release()
+    if not frames:
+        return None
+
+    signatures = [list(image.convert("L").resize((16, 16)).getdata()) for _, image in frames]
+    return [(frames[index][0], _encode_image(frames[index][1], lossless=False)[0]) for index in _pick_keyframes(signatures, count)]
+
+
+def prepare_media(media_type: str, media_path: str, file_hash: str = None) -> PreparedMedia:
+    """
+    Turns a media file into the smallest input the media model can still answer from.
+
+    Images are downscaled, audio becomes a local transcript, and videos become a batch of
+    keyframes with their timestamps. Without the optional faster-whisper or OpenCV packages,
+    audio and video files are sent unchanged.
+    """
+    suffix = Path(media_path).suffix.lower().lstrip(".")
+    if media_type == "image":
+        content, mime_type = downscale_image(media_path)
+        return PreparedMedia(images=[Image(url=_data_url(content, mime_type))])
+    if media_type == "audio":
+        transcript = transcribe_audio(media_path, file_hash)
+        if transcript is None:
+            return PreparedMedia(audio=[Audio(content=Path(media_path).read_bytes(), format=suffix)])
+        return PreparedMedia(context=f"Transcript of the audio file:\n{transcript or '(no speech)'}\n\n")
+    if media_type == "video":
+        keyframes = sample_keyframes(media_path)
+        if keyframes is None:
+            return PreparedMedia(
+                videos=[Video(content=Path(media_path).read_bytes(), format=suffix)],
+                context="Keyframes of the video are not available, it is attached as the original video file.\n\n",
+            )
+        timestamps = ", ".join(_timestamp(seconds) for seconds, _ in keyframes)
+        return PreparedMedia(
+            images=[Image(url=_data_url(content, "image/jpeg")) for _, content in keyframes],
+            context=f"The video is given as {len(keyframes)} keyframes, in order, taken at {timestamps} (minutes:seconds). "
+                    "Its sound is not included.\n\n",
+        )
+    raise ValueError(f"Unsupported media type: {media_type}")
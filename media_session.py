@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from hashing import file_sha256
+from media_preprocessing import PreparedMedia, prepare_media
+
+# --- Constants ---
+# Seconds the first question about a file waits for more questions about the same file
+MEDIA_COALESCE_WINDOW = float(os.getenv("MEDIA_COALESCE_WINDOW", "0.05"))
+MEDIA_CACHE_SIZE = int(os.getenv("MEDIA_CACHE_SIZE", "16"))
+
+_encoded_media = OrderedDict()
+_encoded_media_lock = threading.Lock()
+
+
+def encode_media(media_type: str, media_path: str, file_hash: str = None) -> PreparedMedia:
+    """
+    Returns the prepared media of a file, preprocessed and encoded once per content hash.
+
+    Images and video frames become base64 data URLs, so agno sends them as-is instead of
+    re-reading and re-encoding the file for every request.
+    """
+    file_hash = file_hash or file_sha256(media_path)
+    with _encoded_media_lock:
+        if file_hash in _encoded_media:
+            _encoded_media.move_to_end(file_hash)
+            return _encoded_media[file_hash]
+
+    media = prepare_media(media_type, media_path, file_hash)
+
+    with _encoded_media_lock:
+        _encoded_media[file_hash] = media
+        while len(_encoded_media) > MEDIA_CACHE_SIZE:
+            _encoded_media.popitem(last=False)
+    return media
+
+
+def _parse_answers(content: str, count: int) -> list:
+    """Parses a JSON array of `count` answers out of a model reply, or returns None."""
+    if not content or "[" not in content or "]" not in content:
+        return None
+    try:
+        answers = json.loads(content[content.index("["):content.rindex("]") + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(answers, list) or len(answers) != count:
+        return None
+    return [str(answer) for answer in answers]
+
+
+class _Batch:
+    def __init__(self):
+        self.questions = []
+        self.answers = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MediaSession:
+    """
+    Answers questions about media files for one BasicAgent.
+
+    Questions about the same file that arrive within `coalesce_window` seconds of each other
+    (typically parallel MediaQuestionTool calls of one model turn) are sent as a single
+    multimodal request that returns one answer per question, so the file is uploaded once.
+    Media agents are borrowed from an AgentPool, since one agno agent only runs one call at a time.
+    """
+
+    def __init__(self, agent_pool, coalesce_window: float = MEDIA_COALESCE_WINDOW):
+        self.agent_pool = agent_pool
+        self.coalesce_window = coalesce_window
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def ask(self, media_type: str, media_path: str, question: str) -> str:
+        file_hash = file_sha256(media_path)
+        with self._lock:
+            batch = self._pending.get(file_hash)
+            leader = batch is None
+            if leader:
+                batch = self._pending[file_hash] = _Batch()
+            position = len(batch.questions)
+            batch.questions.append(question)
+
+        if not leader:
+            batch.done.wait()
+            if batch.error is not None:
+                raise batch.error
+            return batch.answers[position]
+
+        time.sleep(self.coalesce_window)
+        with self._lock:
+            del self._pending[file_hash]
+
+        try:
+            batch.answers = self._answer(media_type, media_path, file_hash, batch.questions)
+        except Exception as e:
+            batch.error = e
+            raise
+        finally:
+            batch.done.set()
+        return batch.answers[0]
+
+    def _answer(self, media_type: str, media_path: str, file_hash: str, questions: list) -> list:
+        media = encode_media(media_type, media_path, file_hash)
+
+        if len(questions) > 1:
+            print(f"MediaProcessing batching {len(questions)} questions about {media_path}")
+            numbered = "\n".join(f"{i}. {question}" for i, question in enumerate(questions, start=1))
+            prompt = (
+                f"Describe the content of this {media_type}, including information relevant to the following user questions, "
+                f"then answer each of them.\n{numbered}\n"
+                f"Reply only with a JSON array of {len(questions)} strings, the answer to each question in order."
+            )
+            answers = _parse_answers(self._run(media, prompt), len(questions))
+            if answers is not None:
+                return answers
+            print("MediaProcessing could not parse the batched answers, asking one question at a time")
+
+        return [
+            self._run(
+                media,
+                f"Describe the content of this {media_type}, including information relevant to the following user question. " + question,
+            )
+            for question in questions
+        ]
+
+    def _run(self, media: PreparedMedia, prompt: str) -> str:
+        with self.agent_pool.acquire() as agent:
+            resp = agent.run(
+                media.context + prompt,
+                images=media.images,
+                audio=media.audio,
+                videos=media.videos,
+            )
+        return resp.content
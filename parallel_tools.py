@@ -0,0 +1,154 @@
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from agno.models.openrouter import OpenRouter
+from agno.models.response import ModelResponse, ModelResponseEvent, ToolExecution
+
+from resilience import remaining
+
+# --- Constants ---
+# PARALLEL_TOOL_CALLS=0 runs the tool calls of a model turn one after another, like agno does
+PARALLEL_TOOL_CALLS = os.getenv("PARALLEL_TOOL_CALLS", "1") != "0"
+TOOL_CALL_CONCURRENCY = int(os.getenv("TOOL_CALL_CONCURRENCY", "4"))
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "120"))
+
+PARALLEL_TOOLS_INSTRUCTION = (
+    "Any tool order given above is the order of preference, not a reason to wait: tool calls that do not depend on "
+    "each other's results can be requested together in a single turn, they are executed concurrently and their "
+    "results are returned in the order they were requested."
+)
+
+
+def _pauses_run(function_call) -> bool:
+    function = function_call.function
+    return bool(
+        function.requires_confirmation
+        or function.requires_user_input
+        or function.external_execution
+        or function.name == "get_user_input"
+    )
+
+
+@dataclass
+class ParallelToolsOpenRouter(OpenRouter):
+    """
+    OpenRouter model that executes the independent tool calls of one model turn concurrently.
+
+    Tool calls run on a bounded thread pool with a per-call timeout, and their events and
+    results are handed back in the order the model requested them, so the conversation is
+    the same as with sequential execution. Turns containing calls that pause the run
+    (confirmation, user input, external execution) or running under a tool call limit fall
+    back to agno's sequential implementation.
+
+    `tool_latency` accumulates, per question, the summed tool time (the latency of a
+    sequential dispatch) and the critical path (the slowest call of every turn).
+    """
+
+    max_parallel_tool_calls: int = TOOL_CALL_CONCURRENCY
+    tool_call_timeout: float = TOOL_CALL_TIMEOUT
+    tool_latency: dict = field(default_factory=dict)
+
+    def reset_tool_latency(self) -> None:
+        self.tool_latency = {"calls": 0, "turns": 0, "sequential": 0.0, "critical_path": 0.0}
+
+    def _record_turn(self, durations: list) -> None:
+        if not self.tool_latency:
+            self.reset_tool_latency()
+        self.tool_latency["calls"] += len(durations)
+        self.tool_latency["turns"] += 1
+        self.tool_latency["sequential"] += sum(durations)
+        self.tool_latency["critical_path"] += max(durations, default=0.0)
+
+    def _collect_function_call(self, function_call, additional_input):
+        start = time.perf_counter()
+        function_call_results = []
+        events = list(self.run_function_call(
+            function_call=function_call, function_call_results=function_call_results, additional_input=additional_input
+        ))
+        return events, function_call_results, time.perf_counter() - start
+
+    def _timed_out(self, function_call, timeout: float, function_call_results: list):
+        """Yields the started and completed events of a call that did not finish in time, and records its failure."""
+        function_call.error = f"Tool call timed out after {timeout:g} seconds"
+        print(f"Tool call {function_call.get_call_str()} timed out after {timeout:g} seconds")
+        function_call_results.append(self.create_function_call_result(function_call, success=False))
+        yield ModelResponse(
+            content=function_call.get_call_str(),
+            tool_executions=[
+                ToolExecution(
+                    tool_call_id=function_call.call_id,
+                    tool_name=function_call.function.name,
+                    tool_args=function_call.arguments,
+                )
+            ],
+            event=ModelResponseEvent.tool_call_started.value,
+        )
+        yield ModelResponse(
+            content=function_call.error,
+            tool_executions=[
+                ToolExecution(
+                    tool_call_id=function_call.call_id,
+                    tool_name=function_call.function.name,
+                    tool_args=function_call.arguments,
+                    tool_call_error=True,
+                    result=function_call.error,
+                )
+            ],
+            event=ModelResponseEvent.tool_call_completed.value,
+        )
+
+    def run_function_calls(self, function_calls, function_call_results, additional_input=None,
+                           current_function_call_count=0, function_call_limit=None):
+        if function_call_limit is not None or any(_pauses_run(fc) for fc in function_calls):
+            yield from super().run_function_calls(
+                function_calls=function_calls,
+                function_call_results=function_call_results,
+                additional_input=additional_input,
+                current_function_call_count=current_function_call_count,
+                function_call_limit=function_call_limit,
+            )
+            return
+
+        if additional_input is None:
+            additional_input = []
+
+        # A tool call never waits past the deadline of the question
+        timeout = self.tool_call_timeout
+        if remaining() is not None:
+            timeout = max(0.0, min(timeout, remaining()))
+
+        durations = []
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_parallel_tool_calls, len(function_calls))), thread_name_prefix="tool-call"
+        )
+        try:
+            # Each call runs in a copy of the caller's context, so its trace spans keep their parent
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._collect_function_call, fc, additional_input)
+                for fc in function_calls
+            ]
+            # The timeout counts from when the calls were submitted, not from when each result is awaited
+            wait(futures, timeout=timeout)
+            for fc, future in zip(function_calls, futures):
+                if not future.done():
+                    # The tool thread cannot be interrupted, its late result is discarded
+                    future.cancel()
+                    durations.append(timeout)
+                    yield from self._timed_out(fc, timeout, function_call_results)
+                    continue
+
+                events, results, duration = future.result()
+                durations.append(duration)
+                yield from events
+                function_call_results.extend(results)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        self._record_turn(durations)
+
+        # Add any additional messages at the end
+        if additional_input:
+            function_call_results.extend(additional_input)
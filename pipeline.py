@@ -0,0 +1,455 @@
+"""
+Evaluation pipeline split into three independent stages that share a persisted run manifest:
+
+    fetch   - download the questions and their missing attachments from the scoring API
+    answer  - run the agent on every question that has no answer yet
+    submit  - post the stored answers to the scoring API
+
+Usage:
+    python pipeline.py fetch
+    python pipeline.py answer
+    python pipeline.py submit --username <hf-username>
+    python pipeline.py prompts   # token report of the system prompts
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from attachments import get_attachment_store
+from hashing import text_sha256
+from replay import ReplayMissError, get_replay_store
+from runner import DEFAULT_CONCURRENCY, DEFAULT_TASK_TIMEOUT, collect_results, iter_answers
+from tracing import tracer
+
+# --- Constants ---
+DEFAULT_API_URL = "https://agents-course-unit4-scoring.hf.space"
+DEFAULT_MANIFEST_PATH = os.getenv("RUN_MANIFEST_PATH", str(Path(__file__).parent / "runs" / "manifest.json"))
+
+
+def get_file_path(file_id: str) -> Path:
+    """
+    Returns the absolute path to the attachment of a task in the 'media_files' directory.
+
+    The path comes from the attachment index, which is built once and only restats the
+    file, instead of globbing the directory for every question.
+
+    Args:
+        file_id: The task ID the file is named after (e.g., '123').
+
+    Returns:
+        The absolute Path object for the file, or None if there is none.
+    """
+    path = get_attachment_store().path(file_id)
+    if path is None:
+        print(f"WARNING: No file found with ID '{file_id}' in '{get_attachment_store().directory}'")
+        return None
+
+    print(f"Found file: {path}")
+
+    return path
+
+def resolve_media_path(item: dict) -> Path:
+    """Returns the attachment path for a question item, or None if it has no attachment."""
+    question_text = item.get("question")
+    file_name = item.get("file_name")
+    if 'https' in question_text or '.' in file_name:
+        return get_file_path(item.get("task_id"))
+    return None
+
+
+class RunManifest:
+    """
+    The state of one evaluation run, persisted as JSON after every change.
+
+    Holds the fetched questions, one result per answered task (in the shape produced by
+    runner.iter_answers, plus the fingerprint of the agent that produced it) and the outcome
+    of the last submission. All methods are safe to call from the background answering
+    thread and the UI at the same time.
+    """
+
+    def __init__(self, path: str = DEFAULT_MANIFEST_PATH):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self.questions = []
+        self.results = {}
+        self.fetched_at = None
+        self.submission = None
+        self.fingerprint = None
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.questions = data.get("questions", [])
+            self.results = data.get("results", {})
+            self.fetched_at = data.get("fetched_at")
+            self.submission = data.get("submission")
+            self.fingerprint = data.get("fingerprint")
+
+    def save(self) -> None:
+        with self._lock:
+            data = {
+                "questions": self.questions,
+                "results": self.results,
+                "fetched_at": self.fetched_at,
+                "submission": self.submission,
+                "fingerprint": self.fingerprint,
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+
+    def set_questions(self, questions_data: list) -> None:
+        """Stores a new question list, keeping the results of tasks whose question did not change."""
+        with self._lock:
+            questions_by_id = {item.get("task_id"): item.get("question") for item in questions_data}
+            self.results = {
+                task_id: result for task_id, result in self.results.items()
+                if questions_by_id.get(task_id) == result["question"]
+            }
+            for index, item in enumerate(questions_data):
+                if item.get("task_id") in self.results:
+                    self.results[item.get("task_id")]["index"] = index
+            self.questions = questions_data
+            self.fetched_at = time.time()
+            self.save()
+
+    def set_fingerprint(self, fingerprint: str) -> int:
+        """
+        Drops the results produced by an agent with a different fingerprint (model, prompts,
+        routing, compaction), so they are answered again instead of being submitted.
+
+        Returns:
+            int: The number of dropped results.
+        """
+        with self._lock:
+            stale = [task_id for task_id, result in self.results.items() if result.get("fingerprint") != fingerprint]
+            for task_id in stale:
+                del self.results[task_id]
+            if stale or self.fingerprint != fingerprint:
+                self.fingerprint = fingerprint
+                self.save()
+            if stale:
+                print(f"Dropped {len(stale)} results of a previous agent configuration from {self.path}")
+            return len(stale)
+
+    def stale_task_ids(self, fingerprint: str) -> list:
+        """Task ids of results that are not answers to the fetched questions by an agent with `fingerprint`."""
+        with self._lock:
+            questions_by_id = {item.get("task_id"): item.get("question") for item in self.questions}
+            return [
+                task_id for task_id, result in self.results.items()
+                if result.get("fingerprint") != fingerprint or questions_by_id.get(task_id) != result["question"]
+            ]
+
+    def record(self, result: dict) -> None:
+        with self._lock:
+            self.results[result["task_id"]] = result
+            self.save()
+
+    def answered_task_ids(self) -> set:
+        with self._lock:
+            return {task_id for task_id, result in self.results.items() if result["error"] is None}
+
+    def snapshot(self) -> list:
+        """Copies of the stored task results, in no particular order."""
+        with self._lock:
+            return [dict(result) for result in self.results.values()]
+
+    def collect(self) -> tuple[list, list]:
+        with self._lock:
+            return collect_results(list(self.results.values()))
+
+
+def fetch_questions(manifest: RunManifest, api_url: str = DEFAULT_API_URL) -> tuple[list, str]:
+    """
+    Fetches the questions and stores them in the manifest, then downloads the attachments
+    that are not in the attachment store yet.
+
+    Returns:
+        tuple: (questions_data, error_message), error_message is None on success.
+    """
+    questions_url = f"{api_url}/questions"
+    replay_store = get_replay_store()
+    replay_key = text_sha256(json.dumps(["api", questions_url]))
+    if replay_store.replaying:
+        try:
+            questions_data = replay_store.replay(replay_key, "api", questions_url)
+        except ReplayMissError as e:
+            print(f"Error replaying questions: {e}")
+            return None, f"Error replaying questions: {e}"
+        print(f"Replayed {len(questions_data)} recorded questions.")
+        manifest.set_questions(questions_data)
+        return questions_data, None
+
+    print(f"Fetching questions from: {questions_url}")
+    try:
+        response = requests.get(questions_url, timeout=15)
+        response.raise_for_status()
+        questions_data = response.json()
+        if not questions_data:
+             print("Fetched questions list is empty.")
+             return None, "Fetched questions list is empty or invalid format."
+        print(f"Fetched {len(questions_data)} questions.")
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching questions: {e}")
+        return None, f"Error fetching questions: {e}"
+    except requests.exceptions.JSONDecodeError as e:
+         print(f"Error decoding JSON response from questions endpoint: {e}")
+         print(f"Response text: {response.text[:500]}")
+         return None, f"Error decoding server response for questions: {e}"
+    except Exception as e:
+        print(f"An unexpected error occurred fetching questions: {e}")
+        return None, f"An unexpected error occurred fetching questions: {e}"
+
+    if replay_store.recording:
+        replay_store.put(replay_key, "api", questions_url, questions_data, response.elapsed.total_seconds())
+    manifest.set_questions(questions_data)
+    # A failed download only affects its own question, which is then answered without the file
+    get_attachment_store().download_missing(questions_data, api_url)
+    return questions_data, None
+
+
+def answer_questions(manifest: RunManifest, agent=None, cache=None,
+                     concurrency: int = DEFAULT_CONCURRENCY, task_timeout: float = DEFAULT_TASK_TIMEOUT):
+    """
+    Runs the agent on every question of the manifest that has no successful answer yet and
+    records each result in the manifest as soon as it completes.
+
+    `cancel_answering` stops the run after the questions in progress: queued questions are
+    dropped and stay unanswered in the manifest, so a later run picks them up. Results of an
+    agent with a different fingerprint are dropped first and answered again. Only one run
+    answers at a time in a process, a second one raises AnsweringInProgressError.
+
+    Args:
+        manifest: The run manifest holding the fetched questions.
+        agent: An already built BasicAgent to reuse for the first worker.
+        cache: Optional AnswerCache shared with previous runs.
+
+    Yields:
+        dict: The result of each task, in completion order.
+    """
+    from agent import BasicAgent, agent_fingerprint
+
+    global _run_owner
+    if not _run_guard.acquire(blocking=False):
+        raise AnsweringInProgressError("Answering is already in progress")
+    owner = _run_owner = threading.current_thread()
+    try:
+        # Every extra worker gets its own BasicAgent, the first one is the agent passed in
+        spare_agents = [agent] if agent is not None else []
+        def agent_factory():
+            return spare_agents.pop() if spare_agents else BasicAgent()
+
+        _cancel_event.clear()
+        tracer.start_run()
+        fingerprint = agent_fingerprint()
+        manifest.set_fingerprint(fingerprint)
+        answered = manifest.answered_task_ids()
+        if get_replay_store().recording:
+            # A recording must contain every call of every question, answers served by the answer
+            # cache or kept from an earlier run would be missing when the run is replayed
+            print("Recording: the answer cache and the answers in the manifest are bypassed.")
+            cache = None
+            answered = set()
+        print(f"Running agent on {len(manifest.questions) - len(answered)} questions (concurrency={concurrency})...")
+        for result in iter_answers(manifest.questions, agent_factory, resolve_media_path,
+                                   concurrency=concurrency, task_timeout=task_timeout, cache=cache,
+                                   skip_task_ids=answered):
+            result = dict(result, fingerprint=fingerprint)
+            manifest.record(result)
+            yield result
+            if _cancel_event.is_set():
+                print("Answering cancelled, the remaining questions stay unanswered.")
+                return
+    finally:
+        _release_run_guard(owner)
+
+
+class AnsweringInProgressError(RuntimeError):
+    pass
+
+
+_answering_thread = None
+_answering_lock = threading.Lock()
+# Held while answer_questions runs, whether on the background thread or in a UI callback
+_run_guard = threading.Lock()
+# The thread that holds _run_guard, None when it is free
+_run_owner = None
+_run_owner_lock = threading.Lock()
+_cancel_event = threading.Event()
+
+
+def _release_run_guard(owner: threading.Thread) -> None:
+    # The guard may already have been released by release_cancelled_run, and taken by a new run since
+    global _run_owner
+    with _run_owner_lock:
+        if _run_owner is owner:
+            _run_owner = None
+            _run_guard.release()
+
+
+def cancel_answering() -> None:
+    """Asks the current run of `answer_questions` to stop after the questions in progress."""
+    _cancel_event.set()
+
+
+def release_cancelled_run() -> None:
+    """
+    Releases the guard of a cancelled run that answered in a UI callback. The callback's
+    generator is only closed when the UI gets around to it, until then no new run could start.
+    Background runs are left alone, they release the guard once the questions in progress finish.
+    """
+    with _run_owner_lock:
+        owner = _run_owner
+    if owner is not None and owner is not _answering_thread:
+        _release_run_guard(owner)
+
+
+def answering_cancelled() -> bool:
+    """True when the last run of `answer_questions` was cancelled."""
+    return _cancel_event.is_set()
+
+
+def start_background_answering(manifest: RunManifest, cache=None, **kwargs) -> bool:
+    """
+    Answers the pending questions of the manifest on a background thread, so answering keeps
+    going when the UI callback that started it returns or disconnects.
+
+    Returns:
+        bool: False if a background run is already in progress.
+    """
+    global _answering_thread
+    with _answering_lock:
+        if answering_in_progress():
+            return False
+
+        def run():
+            for _ in answer_questions(manifest, cache=cache, **kwargs):
+                pass
+
+        _answering_thread = threading.Thread(target=run, name="background-answering", daemon=True)
+        _answering_thread.start()
+        return True
+
+
+def answering_in_progress() -> bool:
+    # The background thread counts from its start, before it reaches answer_questions
+    return _run_guard.locked() or (_answering_thread is not None and _answering_thread.is_alive())
+
+
+def submit_answers(manifest: RunManifest, username: str, agent_code: str, api_url: str = DEFAULT_API_URL) -> str:
+    """
+    Submits the answers stored in the manifest.
+
+    Returns:
+        str: The submission status message.
+    """
+    submit_url = f"{api_url}/submit"
+    answers_payload, _ = manifest.collect()
+
+    if not answers_payload:
+        print("Agent did not produce any answers to submit.")
+        return "Agent did not produce any answers to submit."
+
+    # 4. Prepare Submission
+    submission_data = {"username": username.strip(), "agent_code": agent_code, "answers": answers_payload}
+    status_update = f"Agent finished. Submitting {len(answers_payload)} answers for user '{username}'..."
+    print(status_update)
+
+    if get_replay_store().replaying:
+        # Replayed runs are measurements, their answers are never scored
+        print("Replay mode, not submitting.")
+        return f"Replay mode: {len(answers_payload)} answers were produced and not submitted."
+
+    # 5. Submit
+    print(f"Submitting {len(answers_payload)} answers to: {submit_url}")
+    try:
+        response = requests.post(submit_url, json=submission_data, timeout=60)
+        response.raise_for_status()
+        result_data = response.json()
+        final_status = (
+            f"Submission Successful!\n"
+            f"User: {result_data.get('username')}\n"
+            f"Overall Score: {result_data.get('score', 'N/A')}% "
+            f"({result_data.get('correct_count', '?')}/{result_data.get('total_attempted', '?')} correct)\n"
+            f"Message: {result_data.get('message', 'No message received.')}"
+        )
+        print("Submission successful.")
+        with manifest._lock:
+            manifest.submission = {"submitted_at": time.time(), "result": result_data}
+            manifest.save()
+        return final_status
+    except requests.exceptions.HTTPError as e:
+        error_detail = f"Server responded with status {e.response.status_code}."
+        try:
+            error_json = e.response.json()
+            error_detail += f" Detail: {error_json.get('detail', e.response.text)}"
+        except requests.exceptions.JSONDecodeError:
+            error_detail += f" Response: {e.response.text[:500]}"
+        status_message = f"Submission Failed: {error_detail}"
+        print(status_message)
+        return status_message
+    except requests.exceptions.Timeout:
+        status_message = "Submission Failed: The request timed out."
+        print(status_message)
+        return status_message
+    except requests.exceptions.RequestException as e:
+        status_message = f"Submission Failed: Network error - {e}"
+        print(status_message)
+        return status_message
+    except Exception as e:
+        status_message = f"An unexpected error occurred during submission: {e}"
+        print(status_message)
+        return status_message
+
+
+def agent_code_url() -> str:
+    # In the case of an app running as a hugging Face space, this link points toward your codebase ( usefull for others so please keep it public)
+    space_id = os.getenv("SPACE_ID")
+    return f"https://huggingface.co/spaces/{space_id}/tree/main"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST_PATH)
+    parser.add_argument("--api-url", default=DEFAULT_API_URL)
+    subparsers = parser.add_subparsers(dest="stage", required=True)
+    subparsers.add_parser("fetch", help="Fetch the questions into the manifest")
+    answer_parser = subparsers.add_parser("answer", help="Answer the questions that have no answer yet")
+    answer_parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    answer_parser.add_argument("--task-timeout", type=float, default=DEFAULT_TASK_TIMEOUT)
+    submit_parser = subparsers.add_parser("submit", help="Submit the stored answers")
+    submit_parser.add_argument("--username", default=os.getenv("HF_USERNAME"), required=os.getenv("HF_USERNAME") is None)
+    submit_parser.add_argument("--agent-code", default=agent_code_url())
+    subparsers.add_parser("prompts", help="Print the token report of the compiled system prompts")
+    args = parser.parse_args()
+
+    manifest = RunManifest(args.manifest)
+    if args.stage == "fetch":
+        questions_data, error = fetch_questions(manifest, args.api_url)
+        print(error or f"Stored {len(questions_data)} questions in {manifest.path}")
+    elif args.stage == "answer":
+        from agent import agent_fingerprint, question_router
+        from answer_cache import ANSWER_CACHE_ENABLED, AnswerCache
+
+        cache = AnswerCache(fingerprint=agent_fingerprint()) if ANSWER_CACHE_ENABLED else None
+        for result in answer_questions(manifest, cache=cache, concurrency=args.concurrency, task_timeout=args.task_timeout):
+            print(f"Task {result['task_id']}: {result['error'] or result['answer']}")
+        if cache is not None:
+            print(cache.summary())
+        from tool_cache import TOOL_CACHE_ENABLED, get_tool_cache
+        if TOOL_CACHE_ENABLED:
+            print(f"Tool cache:\n{get_tool_cache().report()}")
+        if question_router is not None:
+            print(question_router.summary())
+        from resilience import resilience_report
+        print(f"Providers:\n{resilience_report()}")
+    elif args.stage == "submit":
+        print(submit_answers(manifest, args.username, args.agent_code, args.api_url))
+    elif args.stage == "prompts":
+        from agent import prompt_report
+        print(prompt_report())
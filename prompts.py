@@ -0,0 +1,126 @@
+import functools
+import os
+import re
+
+from tokens import estimate_tokens
+
+# --- Constants ---
+# PROMPT_CACHE_CONTROL is "auto" (markers only for providers that need them), "1" (always) or "0" (never)
+PROMPT_CACHE_CONTROL = os.getenv("PROMPT_CACHE_CONTROL", "auto").strip().lower()
+# OpenRouter providers that only cache prompts marked with cache_control, others cache prefixes automatically
+EXPLICIT_CACHE_PROVIDERS = ("anthropic/", "google/")
+# A sentence whose words appear in the same order within an earlier sentence is a duplicate, if it has at least this many words
+MIN_DUPLICATE_WORDS = 5
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\w+")
+
+
+def split_sentences(text: str) -> list:
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+def _words(sentence: str) -> str:
+    return " " + " ".join(_WORD.findall(sentence.casefold())) + " "
+
+
+class CompiledPrompt:
+    """
+    A system prompt built from named fragments, with its token accounting.
+
+    Tokens are only counted when they are asked for, so compiling the prompts at import does
+    not load the tokenizer.
+    """
+
+    def __init__(self, name: str, text: str, fragments: dict, dropped: list, source_fragments: list):
+        self.name = name
+        self.text = text
+        self.fragments = fragments
+        self.dropped = dropped
+        self.source_fragments = source_fragments
+
+    @functools.cached_property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+    @functools.cached_property
+    def fragment_tokens(self) -> dict:
+        return {name: estimate_tokens(text) for name, text in self.fragments.items()}
+
+    @functools.cached_property
+    def source_tokens(self) -> int:
+        return sum(estimate_tokens(text) for text in self.source_fragments)
+
+    def report(self) -> str:
+        fragments = ", ".join(f"{name} {tokens}" for name, tokens in self.fragment_tokens.items())
+        report = f"{self.name} prompt: {self.tokens} tokens ({fragments})"
+        if self.dropped:
+            report += f", {len(self.dropped)} duplicate sentences removed, {self.source_tokens - self.tokens} tokens saved"
+        return report
+
+
+def compile_prompt(name: str, fragments: list) -> CompiledPrompt:
+    """
+    Joins prompt fragments into one system prompt, dropping repeated instructions.
+
+    `fragments` is a list of (fragment name, text) pairs, in prompt order. Put the fragments
+    that never change first: providers cache the longest identical prompt prefix, so a
+    fragment that varies between runs invalidates the cache for everything after it.
+
+    A sentence is dropped when its words, ignoring case and punctuation, already appeared in
+    the same order earlier in the prompt, so restated instructions are only sent once.
+    """
+    seen = []
+    kept_fragments = {}
+    dropped = []
+    source_fragments = []
+    for fragment_name, text in fragments:
+        if not text:
+            continue
+        source_fragments.append(text)
+        kept = []
+        for sentence in split_sentences(text):
+            words = _words(sentence)
+            if any(words == previous or (len(words.split()) >= MIN_DUPLICATE_WORDS and words in previous) for previous in seen):
+                dropped.append(sentence)
+                continue
+            seen.append(words)
+            kept.append(sentence)
+        if kept:
+            kept_fragments[fragment_name] = " ".join(kept)
+    return CompiledPrompt(name, "\n\n".join(kept_fragments.values()), kept_fragments, dropped, source_fragments)
+
+
+def _needs_cache_control(model_id: str) -> bool:
+    if PROMPT_CACHE_CONTROL == "0":
+        return False
+    if PROMPT_CACHE_CONTROL == "1":
+        return True
+    return model_id.startswith(EXPLICIT_CACHE_PROVIDERS)
+
+
+def with_prompt_caching(model):
+    """
+    Marks the system message of every request of an OpenRouter model as cacheable, and returns the model.
+
+    OpenRouter passes `cache_control` breakpoints on to providers that need them (Anthropic,
+    Gemini), so the unchanged system prompt is billed and processed as a cache read on every
+    turn after the first. OpenAI models cache prefixes automatically and are left alone
+    unless PROMPT_CACHE_CONTROL=1.
+    """
+    if not _needs_cache_control(model.id) or getattr(model, "_prompt_caching", False):
+        return model
+    format_message = model._format_message
+
+    @functools.wraps(format_message)
+    def format_message_with_cache_control(message, *args, **kwargs):
+        message_dict = format_message(message, *args, **kwargs)
+        if message.role == "system" and isinstance(message_dict.get("content"), str):
+            message_dict["content"] = [
+                {"type": "text", "text": message_dict["content"], "cache_control": {"type": "ephemeral"}}
+            ]
+        return message_dict
+
+    model._format_message = format_message_with_cache_control
+    model._prompt_caching = True
+    return model
@@ -0,0 +1,48 @@
+import math
+import re
+from collections import Counter
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN_RE.findall(text.casefold())
+
+
+class BM25:
+    """Okapi BM25 ranking over a fixed list of documents, scored locally."""
+
+    def __init__(self, documents: list, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(document)) for document in documents]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        document_frequency = Counter()
+        for counts in self.term_counts:
+            document_frequency.update(counts.keys())
+        total = len(documents)
+        self.idf = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+    def scores(self, query: str) -> list:
+        terms = set(tokenize(query))
+        scores = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            score = 0.0
+            for term in terms:
+                frequency = counts.get(term)
+                if not frequency:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * length / (self.average_length or 1))
+                score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            scores.append(score)
+        return scores
+
+    def top(self, query: str, count: int) -> list:
+        """Returns the indexes of the `count` best matching documents, best first."""
+        scores = self.scores(query)
+        ranked = sorted(range(len(scores)), key=lambda i: (-scores[i], i))
+        return [i for i in ranked[:count] if scores[i] > 0]
@@ -8,13 +8,21 @@ from agno.tools.wikipedia import WikipediaTools
 from agno.tools.arxiv import ArxivTools
 import os
 
+from agent_pool import AgentPool, openrouter_model, read_prompt
 from image_agent import create_media_agent
+from prompts import compile_prompt, with_prompt_caching
+from resilience import resilient_toolkit
+from tool_cache import cached_toolkit
 
 
 load_dotenv()
 
 openrouter_api_key = os.environ.get("OPENROUTER_API_KEY")
 reasoning_agent_model_id="qwen/qwen3-coder-30b-a3b-instruct"
+system_prompt_path = pathlib.Path(__file__).parent / "system_prompt.txt"
+
+# Media agents are reused across tool calls instead of being built for every call
+media_agent_pool = AgentPool(create_media_agent)
 
 def media_agent_tool(media_path: str = "", question: str = "") -> str:
     """Use this tool to ask a specific question about a local media file (image, audio, or video).
@@ -36,21 +44,27 @@ def media_agent_tool(media_path: str = "", question: str = "") -> str:
     media_path = str(media_path)
     print(f"MediaProcessing received media_path: {media_path}")
 
-    media_agent = create_media_agent()
-    return media_agent.run(question, images=[Image(filepath=media_path)])
+    with media_agent_pool.acquire() as media_agent:
+        return media_agent.run(question, images=[Image(filepath=media_path)])
 
 def create_reasoning_agent():
-    with open("system_prompt.txt", "r") as f:
-        system_prompt = f.read()
+    # Every paragraph of the prompt file is a fragment, repeated sentences are sent once
+    paragraphs = [paragraph for paragraph in read_prompt(str(system_prompt_path)).split("\n\n") if paragraph.strip()]
+    system_prompt = compile_prompt("Reasoning", [(f"paragraph {i}", paragraph) for i, paragraph in enumerate(paragraphs, start=1)])
 
     reasoning_agent = Agent(
-        model=OpenRouter(
+        model=with_prompt_caching(openrouter_model(
             api_key=openrouter_api_key,
             id=reasoning_agent_model_id,
             temperature=0.0,
-        ),
-        instructions=system_prompt,
-        tools=[DuckDuckGoTools(), WikipediaTools(), ArxivTools(), media_agent_tool],
+        )),
+        instructions=system_prompt.text,
+        tools=[
+            cached_toolkit(resilient_toolkit(DuckDuckGoTools(), "duckduckgo")),
+            cached_toolkit(resilient_toolkit(WikipediaTools(), "wikipedia")),
+            cached_toolkit(resilient_toolkit(ArxivTools(), "arxiv")),
+            media_agent_tool,
+        ],
         reasoning=True,
         markdown=True,
     )
@@ -0,0 +1,262 @@
+"""
+Record/replay of model calls, toolkit calls and fetched questions.
+
+With REPLAY_MODE=record every OpenRouter call, every search/Wikipedia/arXiv lookup and the
+fetched question list are stored in a SQLite file next to the other caches. With
+REPLAY_MODE=replay they are served from that file, so BasicAgent and the whole evaluation
+loop run offline, deterministically and for free. A call that was never recorded raises
+ReplayMissError instead of going to the network.
+
+Replayed calls return immediately unless a synthetic latency is configured:
+REPLAY_LATENCY_SCALE multiplies the recorded latency of every call, REPLAY_LATENCY adds a
+fixed number of seconds.
+
+Usage:
+    python replay.py stats
+    python replay.py clear
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from hashing import text_sha256
+from tool_cache import SEARCH_QUERY_ARGUMENTS, normalize_arguments
+
+# --- Constants ---
+DEFAULT_REPLAY_PATH = os.getenv("REPLAY_PATH", str(Path(__file__).parent / "cache" / "replay.sqlite3"))
+# REPLAY_MODE is "record", "replay" or empty to call the real services without recording
+REPLAY_MODE = os.getenv("REPLAY_MODE", "").strip().lower()
+REPLAY_LATENCY_SCALE = float(os.getenv("REPLAY_LATENCY_SCALE", "0"))
+REPLAY_LATENCY = float(os.getenv("REPLAY_LATENCY", "0"))
+
+_USAGE_FIELDS = ("input_tokens", "output_tokens", "total_tokens", "reasoning_tokens", "cache_read_tokens", "cache_write_tokens")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS interactions (
+    interaction_key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    response TEXT NOT NULL,
+    elapsed REAL NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+class ReplayMissError(RuntimeError):
+    """Raised in replay mode for a call that has no recording."""
+
+
+class ReplayStore:
+    """Recorded interactions in SQLite, keyed on a hash of the request."""
+
+    def __init__(self, path: str = DEFAULT_REPLAY_PATH, mode: str = REPLAY_MODE,
+                 latency_scale: float = REPLAY_LATENCY_SCALE, latency: float = REPLAY_LATENCY):
+        if mode not in {"", "record", "replay"}:
+            raise ValueError(f"Unknown REPLAY_MODE: {mode}")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.latency = latency
+        self._lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def get(self, key: str):
+        """Returns (response, elapsed) of a recorded interaction, or None."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT response, elapsed FROM interactions WHERE interaction_key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put(self, key: str, kind: str, name: str, response, elapsed: float) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO interactions VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, name, json.dumps(response, default=str), elapsed, time.time()),
+            )
+
+    def replay(self, key: str, kind: str, name: str):
+        """Returns a recorded response after the synthetic latency, or raises ReplayMissError."""
+        recorded = self.get(key)
+        if recorded is None:
+            raise ReplayMissError(f"No recording of {kind} {name} ({key[:12]}), record it first with REPLAY_MODE=record")
+        response, elapsed = recorded
+        delay = elapsed * self.latency_scale + self.latency
+        if delay > 0:
+            time.sleep(delay)
+        return response
+
+    def stats(self) -> dict:
+        with self._lock, self._connect() as conn:
+            rows = conn.execute("SELECT kind, name, COUNT(*), AVG(elapsed) FROM interactions GROUP BY kind, name").fetchall()
+        return {f"{kind} {name}": {"count": count, "avg_elapsed": avg} for kind, name, count, avg in rows}
+
+    def clear(self) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM interactions")
+
+
+_replay_store = None
+_replay_store_lock = threading.Lock()
+
+
+def get_replay_store() -> ReplayStore:
+    """Returns the replay store shared by every model and toolkit of the process."""
+    global _replay_store
+    with _replay_store_lock:
+        if _replay_store is None:
+            _replay_store = ReplayStore()
+        return _replay_store
+
+
+def _media_hashes(media_list) -> list:
+    hashes = []
+    for media in media_list or []:
+        data = getattr(media, "content", None) or getattr(media, "url", None) or getattr(media, "filepath", None)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        hashes.append(hashlib.sha256(data or b"").hexdigest())
+    return hashes
+
+
+def model_request_key(model_id: str, messages: list) -> str:
+    """Hashes the parts of a conversation that determine the model's reply."""
+    canonical = []
+    for message in messages:
+        canonical.append([
+            message.role,
+            message.get_content_string() if message.content is not None else None,
+            [[call.get("function", {}).get("name"), call.get("function", {}).get("arguments")] for call in message.tool_calls or []],
+            message.tool_call_id,
+            _media_hashes(message.images),
+            _media_hashes(message.audio),
+            _media_hashes(message.videos),
+        ])
+    return text_sha256(json.dumps(["model", model_id, canonical], default=str))
+
+
+def _response_to_dict(response: "ModelResponse") -> dict:
+    usage = response.response_usage
+    return {
+        "role": response.role,
+        "content": response.content if isinstance(response.content, str) or response.content is None else str(response.content),
+        "tool_calls": response.tool_calls,
+        "reasoning_content": response.reasoning_content,
+        "usage": {name: getattr(usage, name) for name in _USAGE_FIELDS} if usage is not None else None,
+    }
+
+
+def _response_from_dict(data: dict) -> "ModelResponse":
+    # agno is imported on first replay, importing the app for the pipeline must stay fast
+    from agno.models.metrics import Metrics
+    from agno.models.response import ModelResponse
+
+    return ModelResponse(
+        role=data["role"],
+        content=data["content"],
+        tool_calls=data["tool_calls"] or [],
+        reasoning_content=data["reasoning_content"],
+        response_usage=Metrics(**data["usage"]) if data["usage"] is not None else None,
+    )
+
+
+def replayable_model(model, store: ReplayStore = None):
+    """Records or replays every call of an agno model, depending on REPLAY_MODE, and returns the model."""
+    store = store or get_replay_store()
+    if not store.mode or getattr(model, "_replayable", False):
+        return model
+    invoke = model.invoke
+
+    @functools.wraps(invoke)
+    def replayable_invoke(messages, assistant_message, **kwargs):
+        key = model_request_key(model.id, messages)
+        if store.replaying:
+            assistant_message.metrics.start_timer()
+            response = _response_from_dict(store.replay(key, "model", model.id))
+            assistant_message.metrics.stop_timer()
+            return response
+
+        start = time.perf_counter()
+        response = invoke(messages=messages, assistant_message=assistant_message, **kwargs)
+        store.put(key, "model", model.id, _response_to_dict(response), time.perf_counter() - start)
+        return response
+
+    model.invoke = replayable_invoke
+    model._replayable = True
+    return model
+
+
+def replayable_function(name: str, function, store: ReplayStore = None, text_arguments=frozenset()):
+    """
+    Returns `function` recording or replaying its results under `name`, depending on REPLAY_MODE.
+    `text_arguments` match regardless of case and spacing.
+    """
+    store = store or get_replay_store()
+    if not store.mode:
+        return function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        arguments = {"args": list(args), **kwargs} if args else kwargs
+        key = text_sha256(json.dumps(["tool", name, normalize_arguments(arguments, text_arguments)], sort_keys=True, default=str))
+        if store.replaying:
+            return store.replay(key, "tool", name)
+
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        store.put(key, "tool", name, result, time.perf_counter() - start)
+        return result
+
+    return wrapper
+
+
+def replayable_toolkit(toolkit, store: ReplayStore = None, text_arguments=SEARCH_QUERY_ARGUMENTS):
+    """Records or replays every function of an agno toolkit in place and returns the toolkit, search queries match regardless of case."""
+    store = store or get_replay_store()
+    if not store.mode:
+        return toolkit
+    for function in toolkit.functions.values():
+        function.entrypoint = replayable_function(function.name, function.entrypoint, store, text_arguments)
+    return toolkit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["stats", "clear"])
+    args = parser.parse_args()
+
+    store = ReplayStore(mode="")
+    if args.command == "stats":
+        stats = store.stats()
+        for name, entry in sorted(stats.items()):
+            print(f"{name}: {entry['count']} recorded, avg {entry['avg_elapsed']:.2f}s")
+        if not stats:
+            print("No recorded interactions")
+    elif args.command == "clear":
+        store.clear()
+        print("Cleared the recorded interactions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import contextvars
+import copy
+import functools
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+# --- Constants ---
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "30"))
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Requests per second and burst size per provider, RATE_LIMIT_<PROVIDER>=0 disables the limit.
+# arXiv asks API clients for at most one request every three seconds.
+DEFAULT_RATE_LIMITS = {"openrouter": 10.0, "google": 1.0, "duckduckgo": 1.0, "wikipedia": 5.0, "arxiv": 0.34}
+DEFAULT_BURSTS = {"openrouter": 20, "google": 2, "duckduckgo": 2, "wikipedia": 5, "arxiv": 1}
+# Seconds after which a duplicate request is sent if the first has not answered, 0 disables hedging
+DEFAULT_HEDGE_AFTER = {}
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+_hedge_executor = ThreadPoolExecutor(max_workers=int(os.getenv("HEDGE_WORKERS", "8")), thread_name_prefix="hedge")
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call would start or retry after the deadline of its question."""
+
+
+@contextmanager
+def deadline(seconds: float = None):
+    """
+    Sets the deadline of everything called inside the block to `seconds` from now.
+
+    Nested deadlines can only shorten the current one. The deadline lives in a context
+    variable, so work submitted with `contextvars.copy_context().run` inherits it.
+    """
+    if seconds is None:
+        yield
+        return
+    current = _deadline.get()
+    token = _deadline.set(min(current, time.monotonic() + seconds) if current else time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float:
+    """Returns the seconds left before the current deadline, or None without a deadline."""
+    current = _deadline.get()
+    return None if current is None else current - time.monotonic()
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` calls per second with bursts of `burst` calls."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Takes one token, sleeping until one is available. Returns the seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            left = remaining()
+            if left is not None and left < delay:
+                raise DeadlineExceeded(f"Rate limit wait of {delay:.1f}s exceeds the deadline")
+            time.sleep(delay)
+            waited += delay
+
+
+def _root_error(error: Exception) -> Exception:
+    # agno wraps provider errors in ModelProviderError, the original error says what went wrong
+    return error.__cause__ or error
+
+
+def _retry_after(error: Exception):
+    headers = getattr(getattr(_root_error(error), "response", None), "headers", None)
+    if headers and headers.get("retry-after"):
+        try:
+            return float(headers.get("retry-after"))
+        except ValueError:
+            return None
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Connection errors, timeouts, rate limits and server errors are retried, everything else is not."""
+    if isinstance(error, DeadlineExceeded):
+        return False
+    root = _root_error(error)
+    status = getattr(root, "status_code", None) or getattr(getattr(root, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES
+    names = {cls.__name__ for cls in type(root).__mro__}
+    return bool(names & {"ConnectionError", "Timeout", "TimeoutError", "TimeoutException", "APIConnectionError",
+                         "APITimeoutError", "TransportError", "RemoteDisconnected"})
+
+
+class Provider:
+    """
+    Rate limit, retry and hedging policy of one upstream service, with its timing statistics.
+
+    `waiting` is the time spent in the rate limiter and in backoff sleeps, `working` the time
+    spent in the calls themselves, so their ratio shows whether throttling or the service is
+    the bottleneck.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, hedge_after: float = 0.0,
+                 max_attempts: int = RETRY_MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.hedge_after = hedge_after
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0, "hedges": 0, "waiting": 0.0, "working": 0.0}
+        self._lock = threading.Lock()
+
+    def _add(self, **values) -> None:
+        with self._lock:
+            for key, value in values.items():
+                self.stats[key] += value
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # Full jitter: a random delay up to the exponential bound, so retrying clients spread out
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = _retry_after(error)
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    def _attempt(self, function):
+        self._add(waiting=self.bucket.acquire(), attempts=1)
+        start = time.perf_counter()
+        try:
+            return function()
+        finally:
+            self._add(working=time.perf_counter() - start)
+
+    def _hedged_attempt(self, request, duplicate):
+        if self.hedge_after <= 0:
+            return self._attempt(request)
+        primary = _hedge_executor.submit(contextvars.copy_context().run, self._attempt, request)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        # The first request is slow, race it against a duplicate and keep whichever answers first
+        self._add(hedges=1)
+        print(f"Hedging slow {self.name} call after {self.hedge_after:g}s")
+        hedge = _hedge_executor.submit(contextvars.copy_context().run, self._attempt, duplicate)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def call(self, function, *args, **kwargs):
+        """Calls `function` under the rate limit, retrying retryable errors until the attempts or the deadline run out."""
+        request = functools.partial(function, *args, **kwargs)
+        return self.call_hedged(request, request)
+
+    def call_hedged(self, request, duplicate):
+        """
+        Like `call`, for the argument-less callables `request`, which sends the request, and
+        `duplicate`, which sends the hedged copy of it. A duplicate runs at the same time as
+        the request it hedges, so it must not write to any state that the request uses.
+        """
+        self._add(calls=1)
+        for attempt in range(self.max_attempts):
+            left = remaining()
+            if left is not None and left <= 0:
+                raise DeadlineExceeded(f"Deadline exceeded before calling {self.name}")
+            try:
+                return self._hedged_attempt(request, duplicate)
+            except Exception as e:
+                if attempt + 1 >= self.max_attempts or not is_retryable(e):
+                    self._add(failures=1)
+                    raise
+                delay = self._backoff(attempt, e)
+                left = remaining()
+                if left is not None and delay >= left:
+                    self._add(failures=1)
+                    raise
+                print(f"Retrying {self.name} call in {delay:.1f}s after {type(e).__name__}: {e}")
+                self._add(retries=1, waiting=delay)
+                time.sleep(delay)
+
+    def report(self) -> str:
+        with self._lock:
+            stats = dict(self.stats)
+        return (
+            f"{self.name}: {stats['calls']} calls, {stats['retries']} retries, {stats['failures']} failures, "
+            f"{stats['hedges']} hedged, {stats['waiting']:.1f}s waiting vs {stats['working']:.1f}s working"
+        )
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name: str) -> Provider:
+    """Returns the process-wide policy of a provider, configured from RATE_LIMIT_*, RATE_BURST_* and HEDGE_AFTER_*."""
+    with _providers_lock:
+        if name not in _providers:
+            key = name.upper()
+            _providers[name] = Provider(
+                name,
+                rate=float(os.getenv(f"RATE_LIMIT_{key}", str(DEFAULT_RATE_LIMITS.get(name, 0.0)))),
+                burst=int(os.getenv(f"RATE_BURST_{key}", str(DEFAULT_BURSTS.get(name, 1)))),
+                hedge_after=float(os.getenv(f"HEDGE_AFTER_{key}", str(DEFAULT_HEDGE_AFTER.get(name, 0.0)))),
+            )
+        return _providers[name]
+
+
+def resilience_report() -> str:
+    with _providers_lock:
+        providers = list(_providers.values())
+    return "\n".join(provider.report() for provider in providers) or "No provider calls"
+
+
+def resilient_model(model, provider: str = "openrouter"):
+    """
+    Sends every call of an agno model through the provider's rate limit and retry policy, and returns the model.
+
+    The HTTP timeout of each request is cut to the time left before the question's deadline.
+    It is passed with the request, the model itself is shared by concurrent calls and is not
+    changed. A hedged request runs on a copy of the model with its own assistant message.
+    The model must not retry on its own (max_retries=0), or retries would multiply.
+    """
+    if getattr(model, "_resilient", False):
+        return model
+    policy = get_provider(provider)
+    invoke = model.invoke
+    get_request_params = model.get_request_params
+    default_timeout = model.timeout
+
+    @functools.wraps(get_request_params)
+    def get_request_params_with_deadline(*args, **kwargs):
+        params = get_request_params(*args, **kwargs)
+        left = remaining()
+        if left is not None:
+            params["timeout"] = max(1.0, min(left, default_timeout or left))
+        return params
+
+    def invoke_on_copy(assistant_message, **kwargs):
+        # Each racing request times and fills its own message, the winner's metrics are kept
+        message = assistant_message.model_copy(deep=True)
+        # The run's first token timing belongs to the caller's run, neither copy may set it
+        response = type(model).invoke(copy.copy(model), assistant_message=message, **dict(kwargs, run_response=None))
+        return response, message
+
+    @functools.wraps(invoke)
+    def resilient_invoke(*args, **kwargs):
+        if policy.hedge_after <= 0 or args or "assistant_message" not in kwargs:
+            return policy.call(invoke, *args, **kwargs)
+        assistant_message = kwargs.pop("assistant_message")
+        request = functools.partial(invoke_on_copy, assistant_message, **kwargs)
+        response, message = policy.call_hedged(request, request)
+        assistant_message.metrics = message.metrics
+        return response
+
+    model.get_request_params = get_request_params_with_deadline
+    model.invoke = resilient_invoke
+    model._resilient = True
+    return model
+
+
+def resilient_toolkit(toolkit, provider: str):
+    """Sends every function of an agno toolkit through the provider's rate limit and retry policy, and returns the toolkit."""
+    policy = get_provider(provider)
+    for function in toolkit.functions.values():
+        function.entrypoint = _resilient_function(policy, function.entrypoint)
+    return toolkit
+
+
+def _resilient_function(policy: Provider, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        return policy.call(function, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,150 @@
+import os
+import re
+import threading
+from collections import Counter
+
+from agno.agent import Agent
+
+from agent_pool import AgentPool, openrouter_model
+from replay import replayable_model
+from tracing import traced_model
+
+# --- Constants ---
+# ROUTER=0 sends every question to the full tool chain
+ROUTER_ENABLED = os.getenv("ROUTER", "1") != "0"
+# Cheap model asked about questions the rules cannot place, empty to use the rules only
+ROUTER_MODEL = os.getenv("ROUTER_MODEL", "")
+
+PLANS = ("no_tools", "search", "file", "media")
+MODEL_TIERS = {
+    "small": os.getenv("MODEL_TIER_SMALL", "openai/gpt-5-nano"),
+    # Empty uses the model of the reasoning agent (agent.openrouter_model_id)
+    "default": os.getenv("MODEL_TIER_DEFAULT", ""),
+    "large": os.getenv("MODEL_TIER_LARGE", "openai/gpt-5"),
+}
+# ROUTER_PLAN_TIERS overrides the tier of some plans, e.g. "no_tools=small,media=large"
+DEFAULT_PLAN_TIERS = {plan: "default" for plan in PLANS}
+
+ROUTER_SYSTEM_MESSAGE = (
+    "Classify the question by the resources needed to answer it. "
+    "Reply with exactly one word: 'no_tools' if it can be answered by reasoning over the question text alone "
+    "(logic, arithmetic, text manipulation, data given in the question), "
+    "or 'search' if it needs facts from the web, Wikipedia or papers."
+)
+
+# Questions that mention these need facts from outside the question
+_LOOKUP_WORDS = re.compile(
+    r"\b(who|when|where|wikipedia|arxiv|published|according|website|paper|article|album|released|born|"
+    r"died|founded|nominated|won|award|olympics|museum|city|country|population|century|\d{4})\b",
+    re.IGNORECASE,
+)
+_COMMON_WORDS = {"the", "a", "an", "of", "to", "is", "in", "if", "you", "this", "and", "as", "what", "write"}
+
+
+def parse_plan_tiers(value: str) -> dict:
+    tiers = dict(DEFAULT_PLAN_TIERS)
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        plan, _, tier = entry.partition("=")
+        if plan.strip() not in PLANS or tier.strip() not in MODEL_TIERS:
+            raise ValueError(f"Invalid ROUTER_PLAN_TIERS entry: {entry}")
+        tiers[plan.strip()] = tier.strip()
+    return tiers
+
+
+PLAN_TIERS = parse_plan_tiers(os.getenv("ROUTER_PLAN_TIERS", ""))
+
+
+def _is_reversed(question: str) -> bool:
+    words = question.casefold().split()
+    reversed_words = question[::-1].casefold().split()
+    return sum(word in _COMMON_WORDS for word in reversed_words) > max(2, 2 * sum(word in _COMMON_WORDS for word in words))
+
+
+def _has_inline_data(question: str) -> bool:
+    # Markdown tables or long listings given in the question itself
+    return question.count("|") >= 6 or question.count("\n") >= 5
+
+
+class RouteDecision:
+    def __init__(self, plan: str, reason: str, source: str = "rules"):
+        self.plan = plan
+        self.reason = reason
+        self.source = source
+        self.tier = PLAN_TIERS[plan]
+        # None leaves the choice of model to the reasoning agent
+        self.model_id = MODEL_TIERS[self.tier] or None
+
+    def to_dict(self) -> dict:
+        return {"plan": self.plan, "tier": self.tier, "model": self.model_id or "agent default", "reason": self.reason, "route_source": self.source}
+
+    def __str__(self) -> str:
+        return f"plan={self.plan} tier={self.tier} ({self.source}: {self.reason})"
+
+
+class QuestionRouter:
+    """
+    Picks the plan of a question before the reasoning agent runs.
+
+    Attachments decide the plan directly (media or file). Text-only questions go through
+    local rules, and the ones the rules cannot place confidently are classified by the
+    optional cheap ROUTER_MODEL; without it they get the search plan. The model tier of each
+    plan comes from ROUTER_PLAN_TIERS. Decisions are counted, so the mix can be reported.
+    """
+
+    def __init__(self, model_id: str = ROUTER_MODEL):
+        self.model_id = model_id
+        self.agent_pool = AgentPool(self._create_agent) if model_id else None
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def _create_agent(self) -> Agent:
+        return Agent(
+            model=traced_model(replayable_model(openrouter_model(
+                api_key=os.environ.get("OPENROUTER_API_KEY"),
+                id=self.model_id,
+                temperature=0.0,
+            ))),
+            reasoning=False,
+            system_message=ROUTER_SYSTEM_MESSAGE,
+        )
+
+    def route(self, question: str, media_type: str = None) -> RouteDecision:
+        decision = self._route(question, media_type)
+        with self._lock:
+            self.counts[decision.plan] += 1
+        print(f"Router: {decision}")
+        return decision
+
+    def _route(self, question: str, media_type: str = None) -> RouteDecision:
+        if media_type in {"image", "audio", "video"}:
+            return RouteDecision("media", f"{media_type} attachment")
+        if media_type is not None:
+            return RouteDecision("file", f"{media_type} attachment")
+        if _is_reversed(question):
+            return RouteDecision("no_tools", "reversed text")
+        if _has_inline_data(question) and not _LOOKUP_WORDS.search(question):
+            return RouteDecision("no_tools", "data given in the question")
+        if self.agent_pool is None or _LOOKUP_WORDS.search(question):
+            return RouteDecision("search", "default")
+
+        try:
+            with self.agent_pool.acquire() as agent:
+                reply = (agent.run(question).content or "").strip().lower()
+        except Exception as e:
+            print(f"Router model failed, using the search plan: {e}")
+            return RouteDecision("search", "router model failed")
+        plan = "no_tools" if "no_tools" in reply else "search"
+        return RouteDecision(plan, f"{self.model_id} replied {reply[:20]!r}", source="model")
+
+    def summary(self) -> str:
+        with self._lock:
+            counts = dict(self.counts)
+        return "Router: " + (", ".join(f"{plan} {count}" for plan, count in sorted(counts.items())) or "no questions")
+
+
+def router_fingerprint() -> str:
+    """Identifies the routing configuration, since it changes which prompt and model answer a question."""
+    if not ROUTER_ENABLED:
+        return "router=off"
+    tiers = ",".join(f"{plan}={MODEL_TIERS[tier] or 'agent default'}" for plan, tier in sorted(PLAN_TIERS.items()))
+    return f"router={ROUTER_MODEL or 'rules'}|{tiers}"
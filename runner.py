@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from resilience import deadline
+from tracing import tracer
+
+# --- Constants ---
+# AGENT_CONCURRENCY=1 keeps the original one-question-at-a-time loop
+DEFAULT_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", "1"))
+# AGENT_TASK_TIMEOUT is in seconds, 0 disables the per-task timeout
+DEFAULT_TASK_TIMEOUT = float(os.getenv("AGENT_TASK_TIMEOUT", "0")) or None
+POLL_INTERVAL = 0.5
+
+
+def _task_result(index: int, item: dict, answer: str = None, error: str = None, elapsed: float = 0.0, cached: bool = False,
+                 confidence: float = None) -> dict:
+    return {
+        "index": index,
+        "task_id": item.get("task_id"),
+        "question": item.get("question"),
+        "answer": answer,
+        "error": error,
+        "elapsed": elapsed,
+        "cached": cached,
+        "confidence": confidence,
+    }
+
+
+def _cached_result(cache, index: int, item: dict, resolve_media_path) -> dict:
+    try:
+        answer = cache.get(item.get("task_id"), item.get("question"), resolve_media_path(item))
+    except Exception as e:
+        print(f"Error reading cached answer for task {item.get('task_id')}: {e}")
+        return None
+    if answer is None:
+        return None
+    return _task_result(index, item, answer=answer, cached=True)
+
+
+def _run_task(agent, index: int, item: dict, resolve_media_path, cache=None, task_timeout: float = None) -> dict:
+    start = time.time()
+    try:
+        media_path = resolve_media_path(item)
+        # Model and tool calls stop retrying once the task has used up its timeout
+        with deadline(task_timeout), tracer.span("task", task_id=item.get("task_id"), question=item.get("question")):
+            submitted_answer = agent(item.get("question"), media_path)
+        if cache is not None and not str(submitted_answer).startswith("AGENT ERROR"):
+            cache.put(item.get("task_id"), item.get("question"), media_path, submitted_answer)
+        # Agents in self-consistency mode report how many of their samples agreed
+        return _task_result(index, item, answer=submitted_answer, elapsed=time.time() - start,
+                            confidence=getattr(agent, "last_confidence", None))
+    except Exception as e:
+        print(f"Error running agent on task {item.get('task_id')}: {e}")
+        return _task_result(index, item, error=str(e), elapsed=time.time() - start)
+
+
+def iter_answers(questions_data: list, agent_factory, resolve_media_path,
+                 concurrency: int = DEFAULT_CONCURRENCY, task_timeout: float = DEFAULT_TASK_TIMEOUT, cache=None,
+                 skip_task_ids=()):
+    """
+    Runs an agent on every question and yields one result dict per task, in completion order.
+
+    With concurrency <= 1 and no timeout the questions are answered one after another on a
+    single agent, exactly like the original loop. Otherwise they run on a bounded thread pool
+    where every worker thread gets its own agent from `agent_factory`, since agno agents keep
+    per-run state and must not be shared between concurrent runs.
+
+    Tasks that already have an answer in `cache` are yielded first without running the agent,
+    and every new answer is written to `cache` as soon as it is produced.
+
+    Args:
+        questions_data: The question items as returned by the scoring API.
+        agent_factory: Zero-argument callable returning a new agent.
+        resolve_media_path: Callable mapping a question item to its attachment path (or None).
+        concurrency: Maximum number of questions answered at the same time.
+        task_timeout: Seconds a single task may run before it is reported as an error.
+        cache: Optional AnswerCache used to skip already answered tasks.
+        skip_task_ids: Task ids that are already answered and must not be run again.
+
+    Yields:
+        dict: index, task_id, question, answer, error, elapsed, cached and confidence for each task.
+    """
+    tasks = []
+    for index, item in enumerate(questions_data):
+        if not item.get("task_id") or item.get("question") is None:
+            print(f"Skipping item with missing task_id or question: {item}")
+            continue
+        if item.get("task_id") in skip_task_ids:
+            continue
+        tasks.append((index, item))
+
+    if cache is not None:
+        remaining = []
+        for index, item in tasks:
+            result = _cached_result(cache, index, item, resolve_media_path)
+            if result is None:
+                remaining.append((index, item))
+            else:
+                print(f"Using cached answer for task {item.get('task_id')}")
+                yield result
+        tasks = remaining
+        if not tasks:
+            return
+
+    if concurrency <= 1 and not task_timeout:
+        agent = agent_factory()
+        for counter, (index, item) in enumerate(tasks, start=1):
+            print(f"Processing question {counter}/{len(tasks)}")
+            yield _run_task(agent, index, item, resolve_media_path, cache, task_timeout)
+        return
+
+    local = threading.local()
+    started = {}
+    counter_lock = threading.Lock()
+    counter = [0]
+
+    def work(index, item):
+        if not hasattr(local, "agent"):
+            local.agent = agent_factory()
+        with counter_lock:
+            counter[0] += 1
+            print(f"Processing question {counter[0]}/{len(tasks)}")
+        started[index] = time.monotonic()
+        return _run_task(local.agent, index, item, resolve_media_path, cache, task_timeout)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="agent-worker")
+    futures = {executor.submit(work, index, item): (index, item) for index, item in tasks}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, item = futures[future]
+                try:
+                    yield future.result()
+                except Exception as e:
+                    # Agent construction failures end up here, _run_task catches everything else
+                    print(f"Error running agent on task {item.get('task_id')}: {e}")
+                    yield _task_result(index, item, error=str(e))
+
+            if task_timeout:
+                now = time.monotonic()
+                for future in list(pending):
+                    index, item = futures[future]
+                    if index in started and now - started[index] > task_timeout:
+                        # The worker thread cannot be interrupted, its late result is discarded
+                        pending.discard(future)
+                        print(f"Task {item.get('task_id')} timed out after {task_timeout:.0f} seconds")
+                        yield _task_result(index, item, error=f"Timed out after {task_timeout:.0f} seconds",
+                                           elapsed=now - started[index])
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def collect_results(results) -> tuple[list, list]:
+    """
+    Orders task results by their position in the question list and builds the submission
+    payload and the results log in the same shape as the original sequential loop.
+
+    Returns:
+        tuple: (answers_payload, results_log)
+    """
+    answers_payload = []
+    results_log = []
+    for result in sorted(results, key=lambda r: r["index"]):
+        if result["error"] is None:
+            answers_payload.append({"task_id": result["task_id"], "submitted_answer": result["answer"]})
+            results_log.append({"Task ID": result["task_id"], "Question": result["question"], "Submitted Answer": result["answer"]})
+        else:
+            results_log.append({"Task ID": result["task_id"], "Question": result["question"], "Submitted Answer": f"AGENT ERROR: {result['error']}"})
+        if result.get("confidence") is not None:
+            results_log[-1]["Confidence"] = round(result["confidence"], 2)
+
+    return answers_payload, results_log
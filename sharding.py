@@ -0,0 +1,169 @@
+"""
+Answers the fetched questions in several worker processes, one shard of questions each.
+
+Every shard has its own run manifest under runs/shards and is answered by a separate
+`python pipeline.py --manifest <shard manifest> answer` process, so CPU-bound work (prompt
+building, attachment parsing, media preprocessing) runs on all cores, and a worker that
+crashes only loses its own in-flight questions. Shard manifests are saved after every
+answer, so rerunning a shard only answers what it is missing. The shard results are then
+merged back into the main manifest, which the submit stage posts as one payload.
+
+Usage:
+    python app.py --headless --shards 4
+    python app.py --headless --rerun-failed
+"""
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from pipeline import RunManifest
+from resilience import DEFAULT_BURSTS, DEFAULT_RATE_LIMITS
+from tracing import tracer
+
+# --- Constants ---
+SHARD_DIR = Path(os.getenv("SHARD_DIR", str(Path(__file__).parent / "runs" / "shards")))
+DEFAULT_SHARDS = int(os.getenv("AGENT_SHARDS", str(os.cpu_count() or 1)))
+
+
+def shard_paths(shard_dir: Path = SHARD_DIR) -> list:
+    return sorted(Path(shard_dir).glob("shard-*.json"), key=lambda path: int(path.stem.split("-")[1]))
+
+
+def plan_shards(manifest: RunManifest, count: int, shard_dir: Path = SHARD_DIR) -> list:
+    """
+    Splits the questions of the manifest round-robin into `count` shard manifests.
+
+    Answers already in the main manifest are copied into the shards, so they are not
+    answered again even when the number of shards changed since the last run.
+
+    Returns:
+        list: The shard manifests.
+    """
+    shard_dir = Path(shard_dir)
+    for stale in shard_paths(shard_dir)[count:]:
+        stale.unlink()
+    answered = manifest.answered_task_ids()
+    results = {result["task_id"]: result for result in manifest.snapshot()}
+    shards = []
+    for shard in range(count):
+        shard_manifest = RunManifest(shard_dir / f"shard-{shard}.json")
+        questions = manifest.questions[shard::count]
+        shard_manifest.set_questions(questions)
+        for index, item in enumerate(questions):
+            if item.get("task_id") in answered:
+                shard_manifest.record(dict(results[item["task_id"]], index=index))
+        shards.append(shard_manifest)
+    return shards
+
+
+def _pending(shard_manifest: RunManifest) -> int:
+    answered = shard_manifest.answered_task_ids()
+    return sum(1 for item in shard_manifest.questions if item.get("task_id") not in answered)
+
+
+def _worker_env(count: int) -> dict:
+    # The rate limits are per process, every worker gets its share of the provider limits
+    env = dict(os.environ)
+    # The spans of all workers belong to the parent's run
+    env["TRACE_RUN_ID"] = tracer.run_id
+    # The limits set in the environment are split as well, they are the limits of the whole run
+    keys = {provider.upper() for provider in DEFAULT_RATE_LIMITS}
+    keys |= {name[len("RATE_LIMIT_"):] for name in os.environ if name.startswith("RATE_LIMIT_")}
+    for key in keys:
+        provider = key.lower()
+        rate = float(os.getenv(f"RATE_LIMIT_{key}", str(DEFAULT_RATE_LIMITS.get(provider, 0.0))))
+        burst = int(os.getenv(f"RATE_BURST_{key}", str(DEFAULT_BURSTS.get(provider, 1))))
+        # A disabled limit (0) stays disabled
+        env[f"RATE_LIMIT_{key}"] = str(rate / count)
+        env[f"RATE_BURST_{key}"] = str(max(1, burst // count))
+    return env
+
+
+def run_shards(shards: list, concurrency: int = 1, task_timeout: float = None) -> dict:
+    """
+    Answers every shard that has unanswered questions in its own worker process and waits for them.
+
+    Returns:
+        dict: Exit code of each shard manifest path that was run.
+    """
+    to_run = [shard for shard in shards if _pending(shard)]
+    if not to_run:
+        return {}
+    tracer.start_run()
+    env = _worker_env(len(to_run))
+    processes = {}
+    for shard in to_run:
+        command = [sys.executable, str(Path(__file__).parent / "pipeline.py"), "--manifest", str(shard.path),
+                   "answer", "--concurrency", str(concurrency)]
+        if task_timeout:
+            command += ["--task-timeout", str(task_timeout)]
+        log = open(shard.path.with_suffix(".log"), "a", encoding="utf-8")
+        print(f"Starting worker for {shard.path.name} ({_pending(shard)} questions), log in {log.name}")
+        processes[shard.path] = (subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, env=env), log)
+
+    exit_codes = {}
+    while len(exit_codes) < len(processes):
+        for path, (process, log) in processes.items():
+            if path not in exit_codes and process.poll() is not None:
+                exit_codes[path] = process.returncode
+                log.close()
+                print(f"Worker for {path.name} exited with code {process.returncode}")
+        time.sleep(0.5)
+    return exit_codes
+
+
+def merge_shards(manifest: RunManifest, shards: list) -> None:
+    """
+    Records the shard results in the main manifest, where a successful answer is never replaced
+    by an error and results of another agent fingerprint are skipped.
+    """
+    positions = {item.get("task_id"): index for index, item in enumerate(manifest.questions)}
+    answered = manifest.answered_task_ids()
+    for shard in shards:
+        for result in shard.snapshot():
+            task_id = result["task_id"]
+            if task_id not in positions or (task_id in answered and result["error"] is not None):
+                continue
+            # Shards kept for --rerun-failed can hold answers of an earlier agent configuration
+            if manifest.fingerprint is not None and result.get("fingerprint") != manifest.fingerprint:
+                continue
+            manifest.record(dict(result, index=positions[task_id]))
+
+
+def run_sharded(manifest: RunManifest, count: int = DEFAULT_SHARDS, concurrency: int = 1,
+                task_timeout: float = None, rerun_failed: bool = False, shard_dir: Path = SHARD_DIR) -> str:
+    """
+    Answers the questions of the manifest in `count` worker processes and merges the results.
+
+    With `rerun_failed`, the existing shards are kept and only the ones with unanswered or
+    failed questions are run again.
+
+    Returns:
+        str: One status line per shard.
+    """
+    from agent import agent_fingerprint
+
+    # Answers of a different agent configuration are neither copied into the shards nor submitted
+    manifest.set_fingerprint(agent_fingerprint())
+    if rerun_failed and shard_paths(shard_dir):
+        shards = [RunManifest(path) for path in shard_paths(shard_dir)]
+        for shard in shards:
+            shard.set_fingerprint(manifest.fingerprint)
+    else:
+        shards = plan_shards(manifest, max(1, count), shard_dir)
+    exit_codes = run_shards(shards, concurrency, task_timeout)
+    shards = [RunManifest(shard.path) for shard in shards]
+    merge_shards(manifest, shards)
+
+    lines = []
+    for shard in shards:
+        pending = _pending(shard)
+        state = "ok" if not pending else "failed, rerun with --rerun-failed"
+        exit_code = exit_codes.get(shard.path)
+        ran = "not run" if exit_code is None else f"exit code {exit_code}"
+        lines.append(f"{shard.path.name}: {len(shard.questions) - pending}/{len(shard.questions)} answered, {ran}, {state}")
+    answers_payload, _ = manifest.collect()
+    lines.append(f"Merged {len(answers_payload)}/{len(manifest.questions)} answers into {manifest.path}")
+    return "\n".join(lines)
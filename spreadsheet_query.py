@@ -0,0 +1,151 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from hashing import file_sha256
+
+# --- Constants ---
+SPREADSHEET_CACHE_SIZE = int(os.getenv("SPREADSHEET_CACHE_SIZE", "8"))
+SAMPLE_ROWS = 5
+MAX_RESULT_ROWS = int(os.getenv("SPREADSHEET_MAX_RESULT_ROWS", "50"))
+# A single CSV sheet is always queried as this table
+DEFAULT_TABLE = "data"
+
+
+def _duckdb():
+    # Imported on first use like pandas, both take a noticeable part of the agent's import time
+    try:
+        import duckdb
+    except ImportError:
+        # duckdb is optional, without it tables are loaded into an in-memory SQLite database
+        return None
+    return duckdb
+
+
+def _table_name(sheet_name: str, taken: set) -> str:
+    name = re.sub(r"\W+", "_", str(sheet_name)).strip("_").lower() or "sheet"
+    if name[0].isdigit():
+        name = f"sheet_{name}"
+    base, number = name, 2
+    while name in taken:
+        name = f"{base}_{number}"
+        number += 1
+    return name
+
+
+def load_tables(path: str) -> dict:
+    """Reads a CSV, TSV or Excel file into DataFrames keyed by table name."""
+    import pandas as pd
+
+    suffix = Path(path).suffix.lower()
+    if suffix in {".csv", ".tsv"}:
+        return {DEFAULT_TABLE: pd.read_csv(path, sep="\t" if suffix == ".tsv" else ",", memory_map=True)}
+
+    sheets = pd.read_excel(path, sheet_name=None)
+    if len(sheets) == 1:
+        return {DEFAULT_TABLE: next(iter(sheets.values()))}
+    tables = {}
+    for sheet_name, frame in sheets.items():
+        tables[_table_name(sheet_name, set(tables))] = frame
+    return tables
+
+
+class SpreadsheetDatabase:
+    """
+    The sheets of one spreadsheet file loaded into an in-memory SQL database.
+
+    Uses DuckDB when it is installed and SQLite otherwise. The database is read-only once
+    loaded, and queries are serialized since neither connection is shared across threads safely.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tables = load_tables(path)
+        self._lock = threading.Lock()
+        duckdb = _duckdb()
+        if duckdb is not None:
+            self.engine = "duckdb"
+            self._conn = duckdb.connect()
+            for name, frame in self.tables.items():
+                self._conn.register(name, frame)
+        else:
+            self.engine = "sqlite"
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+            for name, frame in self.tables.items():
+                frame.to_sql(name, self._conn, index=False)
+            self._conn.execute("PRAGMA query_only = ON")
+
+    def describe(self) -> str:
+        """Returns the schema and a few sample rows of every table, to put into the prompt."""
+        parts = []
+        for name, frame in self.tables.items():
+            columns = ", ".join(f'"{column}" {dtype}' for column, dtype in frame.dtypes.astype(str).items())
+            parts.append(
+                f"Table {name} ({len(frame)} rows): {columns}\n"
+                f"First {min(SAMPLE_ROWS, len(frame))} rows:\n{frame.head(SAMPLE_ROWS).to_csv(index=False)}"
+            )
+        return "\n".join(parts)
+
+    def query(self, sql: str):
+        """Runs a read-only query and returns the result as a DataFrame."""
+        import pandas as pd
+
+        with self._lock:
+            if self.engine == "duckdb":
+                return self._conn.execute(sql).fetchdf()
+            return pd.read_sql_query(sql, self._conn)
+
+
+_databases = OrderedDict()
+_databases_lock = threading.Lock()
+
+
+def get_database(path: str) -> SpreadsheetDatabase:
+    """Returns the database of a spreadsheet file, loaded once per content hash."""
+    key = file_sha256(path)
+    with _databases_lock:
+        if key in _databases:
+            _databases.move_to_end(key)
+            return _databases[key]
+
+    database = SpreadsheetDatabase(path)
+    with _databases_lock:
+        _databases[key] = database
+        while len(_databases) > SPREADSHEET_CACHE_SIZE:
+            _databases.popitem(last=False)
+    return database
+
+
+def format_result(result) -> str:
+    if result.empty:
+        return "Query returned no rows"
+    text = result.head(MAX_RESULT_ROWS).to_csv(index=False)
+    if len(result) > MAX_RESULT_ROWS:
+        text += f"({len(result) - MAX_RESULT_ROWS} more rows not shown, aggregate or add a LIMIT)"
+    return text
+
+
+def SpreadsheetQueryTool(file_path: str = "", sql: str = "") -> str:
+    """Use this tool to compute exact answers from an attached spreadsheet (CSV, TSV or Excel) with a SQL query.
+
+    Args:
+        file_path: The exact local path to the spreadsheet file.
+        sql: A read-only SQL SELECT query over the tables listed in the prompt. Quote column names with double quotes.
+
+    Returns:
+        str: The query result as CSV, or the error message if the query failed, or 'file not found' if the file doesn't exist.
+    """
+
+    if not file_path or not Path(file_path).exists():
+        return 'file not found'
+
+    print(f"SpreadsheetQuery received file_path: {file_path}, sql: {sql}")
+    try:
+        result = format_result(get_database(str(file_path)).query(sql))
+    except Exception as e:
+        return f"Query failed: {e}"
+    print(f"SpreadsheetQuery got result: {result[:200]}")
+    return result
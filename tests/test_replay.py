@@ -0,0 +1,126 @@
+"""
+Record/replay round trip on a stubbed agent: a run is recorded once, then replayed with the
+model and the tool unreachable, and must give the same answer without any live call.
+"""
+import json
+import os
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("AGNO_TELEMETRY", "false")
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agno.agent import Agent
+from agno.models.openrouter import OpenRouter
+from agno.models.response import ModelResponse
+from agno.tools import Toolkit
+
+import replay
+from replay import ReplayMissError, ReplayStore, replayable_model, replayable_toolkit
+from tool_cache import ToolCache, cached_toolkit
+
+live_calls = []
+
+
+@dataclass
+class StubModel(OpenRouter):
+    """Looks a topic up in its first turn and answers with the tool result in its second."""
+
+    id: str = "stub-model"
+    api_key: str = "stub"
+    offline: bool = False
+
+    def invoke(self, messages, assistant_message, **kwargs) -> ModelResponse:
+        if self.offline:
+            raise AssertionError("the model was called while replaying")
+        live_calls.append("model")
+        assistant_message.metrics.start_timer()
+        assistant_message.metrics.stop_timer()
+        results = [message.content for message in messages if message.role == "tool"]
+        if results:
+            return ModelResponse(role="assistant", content=f"Answer: {results[0]}")
+        tool_call = {"id": "call_0", "type": "function",
+                     "function": {"name": "lookup", "arguments": json.dumps({"query": "Mercedes Sosa"})}}
+        return ModelResponse(role="assistant", tool_calls=[tool_call])
+
+
+def _toolkit(offline: bool = False) -> Toolkit:
+    def lookup(query: str) -> str:
+        """Looks up a topic."""
+        if offline:
+            raise AssertionError("the tool was called while replaying")
+        live_calls.append("tool")
+        return f"{query} released 3 albums"
+
+    return Toolkit(name="lookup_tools", tools=[lookup])
+
+
+def _agent(store: ReplayStore, tool_cache: ToolCache, offline: bool = False) -> Agent:
+    # The same wrapping order as agent.create_reasoning_agent
+    toolkit = replayable_toolkit(cached_toolkit(_toolkit(offline), cache=tool_cache), store)
+    return Agent(model=replayable_model(StubModel(offline=offline), store), tools=[toolkit], telemetry=False)
+
+
+@pytest.fixture
+def stores(tmp_path):
+    live_calls.clear()
+    return ReplayStore(tmp_path / "replay.sqlite3", mode="record"), ToolCache(tmp_path / "tools.sqlite3")
+
+
+def test_recorded_run_replays_offline(stores):
+    store, tool_cache = stores
+    recorded = _agent(store, tool_cache).run("How many albums?").content
+    assert live_calls == ["model", "tool", "model"]
+
+    store.mode = "replay"
+    live_calls.clear()
+    assert _agent(store, tool_cache, offline=True).run("How many albums?").content == recorded
+    assert live_calls == []
+
+
+def test_tool_cache_hits_are_recorded(stores):
+    store, tool_cache = stores
+    # Fills the tool cache outside of the recording
+    cached_toolkit(_toolkit(), cache=tool_cache).functions["lookup"].entrypoint(query="Mercedes Sosa")
+
+    recorded = _agent(store, tool_cache).run("How many albums?").content
+    assert live_calls == ["tool", "model", "model"]
+
+    store.mode = "replay"
+    assert _agent(store, ToolCache(Path(store.path).with_name("empty.sqlite3")), offline=True).run("How many albums?").content == recorded
+
+
+def test_unrecorded_call_raises(stores):
+    store, tool_cache = stores
+    store.mode = "replay"
+    with pytest.raises(ReplayMissError):
+        _agent(store, tool_cache, offline=True).run("A question that was never recorded")
+
+
+def test_recording_answers_every_question(tmp_path, monkeypatch):
+    import agent
+    import pipeline
+
+    class EchoAgent:
+        def __call__(self, question, *args, **kwargs):
+            return f"answer to {question}"
+
+    store = ReplayStore(tmp_path / "replay.sqlite3", mode="record")
+    monkeypatch.setattr(replay, "_replay_store", store)
+    monkeypatch.setattr(pipeline, "get_replay_store", lambda: store)
+    monkeypatch.setattr(agent, "BasicAgent", EchoAgent)
+    monkeypatch.setattr(pipeline.tracer, "enabled", False)
+
+    manifest = pipeline.RunManifest(tmp_path / "manifest.json")
+    manifest.set_questions([{"task_id": "a", "question": "q1", "file_name": ""},
+                            {"task_id": "b", "question": "q2", "file_name": ""}])
+    manifest.set_fingerprint(agent.agent_fingerprint())
+    manifest.record({"task_id": "a", "question": "q1", "answer": "old", "error": None, "index": 0,
+                     "fingerprint": agent.agent_fingerprint()})
+
+    answered = {result["task_id"] for result in pipeline.answer_questions(manifest, agent=EchoAgent())}
+    assert answered == {"a", "b"}
@@ -0,0 +1,24 @@
+import functools
+
+CHARS_PER_TOKEN = 4
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding():
+    # Loaded on first use, the encoding tables take a while to load
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # tiktoken is optional, without it tokens are estimated from the text length
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Returns the number of tokens of `text`, exact with tiktoken installed, estimated otherwise."""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // CHARS_PER_TOKEN + 1
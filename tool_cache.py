@@ -0,0 +1,196 @@
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from hashing import text_sha256
+
+# --- Constants ---
+DEFAULT_CACHE_PATH = os.getenv("TOOL_CACHE_PATH", str(Path(__file__).parent / "cache" / "tools.sqlite3"))
+# TOOL_CACHE=0 calls the toolkits directly
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE", "1") != "0"
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", str(7 * 24 * 3600)))
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024"))
+# Free-text query arguments of the search toolkits, which match regardless of case and spacing.
+# Every other argument (code, file paths, ids) must match exactly.
+SEARCH_QUERY_ARGUMENTS = frozenset({"query"})
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tool_results (
+    cache_key TEXT PRIMARY KEY,
+    tool_name TEXT NOT NULL,
+    arguments TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+def normalize_arguments(value, text_arguments=frozenset()):
+    """
+    Sorts keys, and collapses whitespace and folds case in the string values of the top-level
+    `text_arguments`, so equivalent tool arguments compare equal. Other values are kept as is.
+    """
+    if isinstance(value, dict):
+        return {
+            key: " ".join(item.split()).casefold() if key in text_arguments and isinstance(item, str) else normalize_arguments(item)
+            for key, item in sorted(value.items())
+        }
+    if isinstance(value, (list, tuple)):
+        return [normalize_arguments(item) for item in value]
+    return value
+
+
+class ToolCache:
+    """
+    Memoizes tool results in an in-memory LRU backed by SQLite on disk.
+
+    Results are keyed on the tool name and its normalized arguments (keys sorted, whitespace
+    collapsed and case folded in free-text queries) and expire after `ttl` seconds. The memory layer keeps the
+    `max_entries` most recently used results, the disk layer survives restarts.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = TOOL_CACHE_TTL, max_entries: int = TOOL_CACHE_MAX_ENTRIES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {}
+
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def key(self, tool_name: str, arguments: dict, text_arguments=frozenset()) -> str:
+        return text_sha256(json.dumps([tool_name, normalize_arguments(arguments, text_arguments)], sort_keys=True, default=str))
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            if key in self._memory:
+                result, created_at = self._memory[key]
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    return result
+                del self._memory[key]
+
+            with self._connect() as conn:
+                row = conn.execute("SELECT result, created_at FROM tool_results WHERE cache_key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.ttl:
+                    conn.execute("DELETE FROM tool_results WHERE cache_key = ?", (key,))
+                    return None
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def put(self, key: str, tool_name: str, arguments: dict, result: str) -> None:
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, result, created_at)
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO tool_results VALUES (?, ?, ?, ?, ?)",
+                    (key, tool_name, json.dumps(arguments, default=str), result, created_at),
+                )
+
+    def _remember(self, key: str, result: str, created_at: float) -> None:
+        self._memory[key] = (result, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def evict(self) -> int:
+        """Removes expired results from disk. Returns the number of removed results."""
+        with self._lock, self._connect() as conn:
+            return conn.execute("DELETE FROM tool_results WHERE created_at < ?", (time.time() - self.ttl,)).rowcount
+
+    def clear(self) -> None:
+        with self._lock, self._connect() as conn:
+            self._memory.clear()
+            conn.execute("DELETE FROM tool_results")
+
+    def record(self, tool_name: str, hit: bool, elapsed: float) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(tool_name, {"hits": 0, "misses": 0, "hit_time": 0.0, "miss_time": 0.0})
+            if hit:
+                stats["hits"] += 1
+                stats["hit_time"] += elapsed
+            else:
+                stats["misses"] += 1
+                stats["miss_time"] += elapsed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {tool_name: dict(stats) for tool_name, stats in self._stats.items()}
+
+    def report(self) -> str:
+        lines = []
+        for tool_name, stats in sorted(self.stats().items()):
+            calls = stats["hits"] + stats["misses"]
+            hit_latency = stats["hit_time"] / stats["hits"] if stats["hits"] else 0.0
+            miss_latency = stats["miss_time"] / stats["misses"] if stats["misses"] else 0.0
+            lines.append(
+                f"{tool_name}: {stats['hits']}/{calls} hits ({stats['hits'] / calls:.0%}), "
+                f"avg {hit_latency * 1000:.0f}ms cached vs {miss_latency * 1000:.0f}ms live"
+            )
+        return "\n".join(lines) or "No tool calls"
+
+    def wrap(self, tool_name: str, function, text_arguments=frozenset()):
+        """Returns `function` with its results memoized under `tool_name`, `text_arguments` match regardless of case."""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            arguments = {"args": list(args), **kwargs} if args else kwargs
+            key = self.key(tool_name, arguments, text_arguments)
+            start = time.perf_counter()
+            result = self.get(key)
+            if result is not None:
+                self.record(tool_name, True, time.perf_counter() - start)
+                print(f"Tool cache hit: {tool_name}({kwargs})")
+                return result
+
+            result = function(*args, **kwargs)
+            self.record(tool_name, False, time.perf_counter() - start)
+            if isinstance(result, str) and result:
+                self.put(key, tool_name, arguments, result)
+            return result
+
+        return wrapper
+
+
+_tool_cache = None
+_tool_cache_lock = threading.Lock()
+
+
+def get_tool_cache() -> ToolCache:
+    """Returns the tool cache shared by every agent of the process."""
+    global _tool_cache
+    with _tool_cache_lock:
+        if _tool_cache is None:
+            _tool_cache = ToolCache()
+        return _tool_cache
+
+
+def cached_toolkit(toolkit, cache: ToolCache = None, text_arguments=SEARCH_QUERY_ARGUMENTS):
+    """
+    Memoizes every function of an agno toolkit in place and returns the toolkit.
+
+    The wrapped entrypoints keep their name, signature and docstring, so the model sees
+    exactly the same tool definitions as with the plain toolkit. `text_arguments` are the
+    free-text arguments compared regardless of case, the search queries by default.
+    """
+    if not TOOL_CACHE_ENABLED:
+        return toolkit
+
+    cache = cache or get_tool_cache()
+    for function in toolkit.functions.values():
+        function.entrypoint = cache.wrap(function.name, function.entrypoint, text_arguments)
+    return toolkit
@@ -0,0 +1,256 @@
+"""
+Structured tracing of agent runs.
+
+Every question, agent run, continue_run iteration, model call and tool call is recorded as a
+span and appended to a JSONL file, one span per line, with the field names of the
+OpenTelemetry span data model (trace_id, span_id, parent_span_id, start_time_unix_nano, ...)
+so the file can be converted to OTLP or loaded into any trace viewer. Every span also carries
+the id of the run it belongs to, so reports cover one run of the append-only file.
+
+Usage:
+    python tracing.py [TRACE_PATH] [--run RUN_ID | --all]   # prints the summary report of the last run
+"""
+import argparse
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+# --- Constants ---
+DEFAULT_TRACE_PATH = os.getenv("TRACE_PATH", str(Path(__file__).parent / "runs" / "traces.jsonl"))
+# TRACING=0 disables span recording
+TRACING_ENABLED = os.getenv("TRACING", "1") != "0"
+# Prices in USD per million tokens, used when the provider does not report the cost of a call
+MODEL_INPUT_PRICE = float(os.getenv("MODEL_INPUT_PRICE", "0.25"))
+MODEL_OUTPUT_PRICE = float(os.getenv("MODEL_OUTPUT_PRICE", "2.0"))
+SLOWEST_TASKS = 5
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name: str, parent: "Span" = None, attributes: dict = None, run_id: str = None):
+        self.name = name
+        self.run_id = parent.run_id if parent else run_id
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.status = {"code": "OK"}
+        self.start_time_unix_nano = time.time_ns()
+        self.end_time_unix_nano = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update({key: value for key, value in attributes.items() if value is not None})
+
+    def fail(self, message: str) -> None:
+        self.status = {"code": "ERROR", "message": message}
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_time_unix_nano or time.time_ns()) - self.start_time_unix_nano) / 1e9
+
+    def to_dict(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_time_unix_nano,
+            "end_time_unix_nano": self.end_time_unix_nano,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class Tracer:
+    """
+    Records spans to a JSONL file.
+
+    The current span is kept in a context variable, so spans opened inside another span
+    become its children. Threads do not inherit the context, work handed to a thread pool
+    must be submitted with `contextvars.copy_context().run` to stay in the same trace.
+
+    Spans are tagged with `run_id`, which `start_run` renews for every evaluation run. Worker
+    processes get the id of their parent's run through TRACE_RUN_ID.
+    """
+
+    def __init__(self, path: str = DEFAULT_TRACE_PATH, enabled: bool = TRACING_ENABLED):
+        self.path = Path(path)
+        self.enabled = enabled
+        self.run_id = os.getenv("TRACE_RUN_ID") or secrets.token_hex(8)
+        self._lock = threading.Lock()
+
+    def start_run(self) -> str:
+        """Starts a new run, the spans opened from now on carry its id."""
+        self.run_id = os.getenv("TRACE_RUN_ID") or secrets.token_hex(8)
+        return self.run_id
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            yield Span(name, attributes=attributes)
+            return
+
+        span = Span(name, parent=_current_span.get(), attributes=attributes, run_id=self.run_id)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_time_unix_nano = time.time_ns()
+            self.write(span)
+
+    def write(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+tracer = Tracer()
+
+
+def current_span() -> Span:
+    return _current_span.get()
+
+
+def model_call_cost(metrics) -> float:
+    """Returns the USD cost of a model call, as reported by the provider or estimated from token counts."""
+    provider_cost = (metrics.provider_metrics or {}).get("cost")
+    if provider_cost is not None:
+        return float(provider_cost)
+    return (metrics.input_tokens * MODEL_INPUT_PRICE + metrics.output_tokens * MODEL_OUTPUT_PRICE) / 1e6
+
+
+def traced_model(model, tracer: Tracer = tracer):
+    """Records a span with token counts and cost for every call of an agno model, and returns the model."""
+    if getattr(model, "_traced", False):
+        return model
+    invoke = model.invoke
+
+    @functools.wraps(invoke)
+    def traced_invoke(*args, **kwargs):
+        with tracer.span("model.invoke", model=model.id) as span:
+            response = invoke(*args, **kwargs)
+            # agno only adds the usage to the assistant message after invoke returns
+            metrics = response.response_usage
+            if metrics is not None:
+                span.set(
+                    input_tokens=metrics.input_tokens,
+                    output_tokens=metrics.output_tokens,
+                    reasoning_tokens=metrics.reasoning_tokens,
+                    cache_read_tokens=metrics.cache_read_tokens,
+                    cost=model_call_cost(metrics),
+                )
+            span.set(tool_calls=len(response.tool_calls or []))
+            return response
+
+    model.invoke = traced_invoke
+    model._traced = True
+    return model
+
+
+def trace_tool_hook(function_name: str, function_call, arguments: dict):
+    """agno tool hook recording a span for every tool call."""
+    with tracer.span("tool.call", tool=function_name, arguments=json.dumps(arguments, default=str)[:500]) as span:
+        result = function_call(**arguments)
+        span.set(result_chars=len(str(result)))
+        return result
+
+
+def load_spans(path: str = DEFAULT_TRACE_PATH) -> list:
+    if not Path(path).exists():
+        return []
+    spans = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return spans
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(spans: list) -> str:
+    """Returns a report of the p50/p95 latency per tool and model, the tokens per question and per router plan, and the slowest tasks."""
+    if not spans:
+        return "No traces recorded"
+
+    durations = defaultdict(list)
+    tokens = defaultdict(int)
+    cost = defaultdict(float)
+    tasks = []
+    plans = defaultdict(list)
+    for span in spans:
+        attributes = span.get("attributes", {})
+        if span["name"] == "question" and "plan" in attributes:
+            plans[f"{attributes['plan']} on {attributes.get('model')}"].append(span)
+        if span["name"] == "tool.call":
+            durations[attributes.get("tool", "unknown")].append(span["duration"])
+        elif span["name"] == "model.invoke":
+            durations[f"model {attributes.get('model', 'unknown')}"].append(span["duration"])
+            tokens[span["trace_id"]] += attributes.get("input_tokens", 0) + attributes.get("output_tokens", 0)
+            cost[span["trace_id"]] += attributes.get("cost", 0.0)
+        elif span["parent_span_id"] is None:
+            tasks.append(span)
+
+    lines = ["Latency per tool:"]
+    for name, values in sorted(durations.items()):
+        lines.append(f"  {name}: {len(values)} calls, p50 {percentile(values, 0.5):.2f}s, p95 {percentile(values, 0.95):.2f}s")
+
+    if tasks:
+        task_tokens = [tokens[task["trace_id"]] for task in tasks]
+        lines.append(
+            f"Tokens per question: avg {sum(task_tokens) / len(task_tokens):.0f}, max {max(task_tokens)}, "
+            f"total cost ${sum(cost[task['trace_id']] for task in tasks):.4f}"
+        )
+        if plans:
+            lines.append("Per plan:")
+            for name, questions in sorted(plans.items()):
+                plan_tokens = sum(tokens[question["trace_id"]] for question in questions)
+                lines.append(
+                    f"  {name}: {len(questions)} questions, avg {sum(q['duration'] for q in questions) / len(questions):.2f}s, "
+                    f"avg {plan_tokens / len(questions):.0f} tokens"
+                )
+        lines.append("Slowest tasks:")
+        for task in sorted(tasks, key=lambda task: task["duration"], reverse=True)[:SLOWEST_TASKS]:
+            attributes = task.get("attributes", {})
+            label = attributes.get("task_id") or str(attributes.get("question", ""))[:50]
+            lines.append(f"  {label}: {task['duration']:.2f}s, {tokens[task['trace_id']]} tokens")
+    return "\n".join(lines)
+
+
+def trace_report(path: str = DEFAULT_TRACE_PATH, run_id: str = None, all_runs: bool = False) -> str:
+    """Summarizes the spans of one run, by default the last one recorded in the file."""
+    spans = load_spans(path)
+    if not all_runs and spans:
+        run_id = run_id or spans[-1].get("run_id")
+        spans = [span for span in spans if span.get("run_id") == run_id]
+    return summarize(spans)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", default=DEFAULT_TRACE_PATH)
+    parser.add_argument("--run", help="Id of the run to summarize, the last one by default")
+    parser.add_argument("--all", action="store_true", help="Summarize every run in the file")
+    args = parser.parse_args()
+    print(trace_report(args.path, run_id=args.run, all_runs=args.all))